@@ -1,665 +1,660 @@
+import copy
+from collections import deque
+from bitmask import popcount, lowest_value, range_mask
+from VariableOrder import VariableOrder
+from tables import column_table
+from ConstraintGraph import ConstraintGraph
+
+
 # This class contains all the methods used in the algorithm:
 # - assignment_is_complete(): Returns whether an assignment is complete
-# - get_degree(): Returns the degree of a variable v by going through every constraint
-#   and seeing how many unassigned variables there are in the constraints shared with v
-# - is_consistent(): Returns whether the new assignment is consistent in a similar manner
-#   to get_degree(), by going through all the constraints and verifying that they are met.
-#   It differs from get_degree() because if multiple variables have the same letter, it must
-#   go through every variable and check its constraints as well.
+# - get_degree(): Returns the degree of a variable v: the unassigned letters it must be
+#   different from plus its unassigned neighbours in the constraint graph (see
+#   ConstraintGraph.py). The counts are updated when a letter is (un)assigned, in
+#   O(number of neighbours), so a query does not look at the constraints.
+# - is_consistent(): Returns whether the new assignment is consistent by going through the
+#   constraints of the letter of the variable and verifying that they are met.
 # - set_assigned(): When a letter is assigned a value, goes through every variable with that
-#   letter and sets it as assigned.
+#   letter, sets it as assigned and takes it out of the unassigned neighbours count of
+#   its neighbours.
 # - set_unassigned(): Does the opposite of set_assigned().
-# - update_domains(): Similar to get_degree() and is_consistent(), it goes through all the
-#   constraints, and tries all the values for the variable. Every value that does not satisfy
-#   the constraint is removed from the domain list of CSP.
+# - update_domains(): Removes the value from the domains of the other letters and then
+#   propagates the new value through the constraints (see propagate()). Returns False when a
+#   domain becomes empty.
+# - propagate(): Constraint propagation engine, selected with the propagation argument:
+#   - 'forward': only forward checking. A column with one unassigned letter left keeps the
+#     value of that letter that satisfies it.
+#   - 'bounds': a worklist of columns, where every column is made bounds consistent: the
+#     smallest and biggest values of every letter must be reachable with the bounds of the
+#     other letters of the column. When a domain changes, the other columns of its letter go
+#     back to the worklist. A letter with a single value left is removed from the others.
+#   - 'hall': like 'bounds', but the all different constraint also looks for Hall intervals:
+#     when k letters only have values in an interval of k digits, no other letter can take
+#     a value in that interval.
+#   - 'table': like 'bounds', but the columns are made arc consistent with the lookup
+#     tables of tables.py: every value left in a domain belongs to a feasible tuple of
+#     the column. Columns without a table use the bounds consistency.
+# - remove_value() / restrict(): Remove values from a domain and record the old domain
+#   in the trail.
+# - trail_mark() / undo(): Every change is stored in the trail, so instead of copying the
+#   whole CSP before trying a value, backtrack() takes a mark and undoes the changes made
+#   after it. The work done on backtrack is proportional to the number of changes.
+# - domain_size(): Number of values left in the domain of a variable.
+# - graph: ConstraintGraph of the columns. A CSP can be given the graph of another CSP
+#   of the same puzzle instead of building it again.
+# - restore(): Puts the CSP in the state of a node given by its domains and assigned
+#   variables, e.g. a node packed with packed.py in another process.
+# - stats: Stats of the search, or None. The propagation counts the domain reductions of
+#   every constraint in it.
+# - nogoods: NogoodStore of the search, or None.
+# - strategy: Strategy of the search, or None. It is told about every column that
+#   empties a domain, for the weights of dom/wdeg.
+# - order: VariableOrder with the unassigned variables bucketed by domain size. It is
+#   updated only when a domain changes or a variable is (un)assigned.
+#
+# Domains are int bitmasks (see bitmask.py): bit v is set when v is in the domain. The
+# digits taken by the assigned letters are kept in the mask self.used, so checking the
+# all different constraint for a value is a single AND.
+#
+# The column constraints come from Puzzle: every constraint is a pair (ids, coefs) that
+# means sum(coefs[k] * value(ids[k])) == 0. The variables that are not carries are the
+# letter positions and must take all different values when their letters differ. In
+# a multiplication an id can be a pair (i, k) for the product x_i * x_k: those terms
+# are kept apart in constraint_products, so the columns of a sum, which have none,
+# run exactly the same code as before.
+#
+# All the positions of a letter take the same value, so the constructor indexes the
+# puzzle by letter once: the positions of every letter (letter_positions), the
+# constraints every letter appears in (letter_constraints) and every constraint as
+# (letter, coefficient) terms with the coefficients of a repeated letter added together
+# (constraint_terms). Carries are indexed with their own name as letter.
 class CSP:
-    def __init__(self, variables, domains, _constraints):
+    USED = -1
+    PROPAGATIONS = ('forward', 'bounds', 'hall', 'table')
+
+    def __init__(self, variables, domains, _constraints, propagation='bounds', graph=None):
+        if propagation not in CSP.PROPAGATIONS:
+            raise ValueError('Unknown propagation: ' + repr(propagation))
         self.variables = variables
         self.domains = domains
         self.constraints = _constraints
+        self.propagation = propagation
+
+        self.num_positions = 0
+        for x in variables:
+            if not x.is_carry:
+                self.num_positions += 1
+
+        # For every constraint the ids of its variables, and for every variable the
+        # indices of the constraints it appears in and its neighbours
+        if graph is None:
+            graph = ConstraintGraph(len(variables), _constraints)
+        self.graph = graph
+        self.constraint_vars = graph.constraint_vars
+        self.var_constraints = graph.var_constraints
+
+        # Distinct letters that are not carries, in order of first position
+        self.letters = []
+        self.letter_positions = {}
+        for x in variables:
+            if x.letter not in self.letter_positions:
+                self.letter_positions[x.letter] = []
+                if not x.is_carry:
+                    self.letters.append(x.letter)
+            self.letter_positions[x.letter].append(x.id)
+
+        self.constraint_terms = []
+        self.constraint_products = []
+        self.letter_constraints = {letter: [] for letter in self.letter_positions}
+        for c, (ids, coefs) in enumerate(_constraints):
+            letter_coefs = {}
+            product_coefs = {}
+            for k in range(len(ids)):
+                if isinstance(ids[k], tuple):
+                    pair = tuple(sorted(variables[i].letter for i in ids[k]))
+                    product_coefs[pair] = product_coefs.get(pair, 0) + coefs[k]
+                else:
+                    letter = variables[ids[k]].letter
+                    letter_coefs[letter] = letter_coefs.get(letter, 0) + coefs[k]
+            terms = tuple((letter, coef) for letter, coef in letter_coefs.items() if coef != 0)
+            products = tuple((pair[0], pair[1], coef) for pair, coef in product_coefs.items() if coef != 0)
+            self.constraint_terms.append(terms)
+            self.constraint_products.append(products)
+            for letter, _ in terms:
+                self.letter_constraints[letter].append(c)
+            for first, second, _ in products:
+                for letter in (first, second):
+                    if c not in self.letter_constraints[letter]:
+                        self.letter_constraints[letter].append(c)
+
+        # Table of every column for the 'table' propagation (see tables.py), built from
+        # the biggest value of the initial domains
+        self.column_tables = None
+        if propagation == 'table':
+            highs = {letter: domains[ids[0]].bit_length() - 1 for letter, ids in self.letter_positions.items()}
+            self.column_tables = [column_table(self.constraint_terms[c], highs, self.constraint_products[c])
+                                  for c in range(len(_constraints))]
+
+        self.order = VariableOrder([popcount(domain) for domain in domains])
+        for x in variables:
+            if x.is_assigned:
+                self.order.remove(x.id)
+        self.count_unassigned()
+
+        # Digits taken by the assigned letters
+        self.used = 0
+
+        # Stack of (id, old domain) pairs, one for every change of a domain. The id
+        # USED means the pair holds the old value of self.used.
+        self.trail = []
+
+        # Stats of the search (see Stats.py), None when they are not collected
+        self.stats = None
+        # Store of failed subproblems (see NogoodStore.py), None when it is not used
+        self.nogoods = None
+        # Heuristics of the search (see Strategy.py), None for the default ones
+        self.strategy = None
+        self.constraint_names = ['column ' + str(c) for c in range(len(_constraints))]
+
+    # The compiled constraints never change during the search, so a copy of the CSP
+    # only needs new variables and domains and can share everything else.
+    def __deepcopy__(self, memo):
+        new_csp = copy.copy(self)
+        new_csp.variables = [copy.copy(x) for x in self.variables]
+        new_csp.domains = list(self.domains)
+        new_csp.order = copy.deepcopy(self.order, memo)
+        new_csp.trail = list(self.trail)
+        new_csp.unassigned_neighbours = list(self.unassigned_neighbours)
+        return new_csp
+
+    # Puts the CSP in the state of a node of the search, given by the domain of every
+    # variable and whether it is assigned (see packed.py), and returns the assignment
+    # of the node. The value of an assigned variable is the only one in its domain.
+    def restore(self, domains, assigned):
+        self.domains = list(domains)
+        self.order = VariableOrder([popcount(domain) for domain in self.domains])
+        self.used = 0
+        self.trail = []
+        assignment = {}
+        for x in self.variables:
+            x.is_assigned = assigned[x.id]
+            if x.is_assigned:
+                self.order.remove(x.id)
+                value = lowest_value(self.domains[x.id])
+                assignment[x.letter] = value
+                if not x.is_carry:
+                    self.used |= 1 << value
+        self.count_unassigned()
+        return assignment
+
+    # Counts from scratch the unassigned letters and the unassigned neighbours of
+    # every variable, which set_assigned() and set_unassigned() then keep up to date
+    def count_unassigned(self):
+        self.unassigned_letters = 0
+        for letter in self.letters:
+            if not self.variables[self.letter_positions[letter][0]].is_assigned:
+                self.unassigned_letters += 1
+        self.unassigned_neighbours = []
+        for neighbours in self.graph.neighbours:
+            count = 0
+            for i in neighbours:
+                if not self.variables[i].is_assigned:
+                    count += 1
+            self.unassigned_neighbours.append(count)
 
     # If every variable is assigned, return true, otherwise return false
     def assignment_is_complete(self):
-        complete = True
-        for x in self.variables:
-            if not x.is_assigned:
-                complete = False
+        return self.order.count == 0
 
-        return complete
+    def domain_size(self, id_var):
+        return self.order.sizes[id_var]
 
+    # Unassigned letters that must be different from the variable (every other letter
+    # for a letter position) plus its unassigned neighbours in the columns. Both
+    # counts are kept by set_assigned() and set_unassigned(), so this is O(1).
     def get_degree(self, id_var):
-        degree = 0
-        counted = []
+        degree = self.unassigned_neighbours[id_var]
 
         # Constraint: All letters must be different
-        if id_var in range(13):
-            counted_letters = []
-            for i in range(13):
-                if self.variables[i].letter == self.variables[id_var].letter:
-                    continue
-
-                if not self.variables[i].is_assigned and self.variables[i].letter not in counted_letters:
-                    counted_letters.append(self.variables[i].letter)
-                    degree += 1
-        # Constraint: x3 + x7 = x12 + 10 * c0
-        if id_var in [3, 7, 12, 13]:
-            for i in [3, 7, 12, 13]:
-                if i == id_var:
-                    continue
-                if not self.variables[i].is_assigned and i not in counted:
-                    degree += 1
-                    counted.append(i)
-        # Constraint: c0 + x2 + x6 = x11 + 14 + 10 * c1
-        if id_var in [13, 2, 6, 11, 14]:
-            for i in [13, 2, 6, 11, 14]:
-                if i == id_var:
-                    continue
-                if not self.variables[i].is_assigned and i not in counted:
-                    degree += 1
-                    counted.append(i)
-        # Constraint: c1 + x1 + x5 = x10 + 15 + 10 * c2
-        if id_var in [14, 1, 5, 10, 15]:
-            for i in [14, 1, 5, 10, 15]:
-                if i == id_var:
-                    continue
-                if not self.variables[i].is_assigned and i not in counted:
-                    degree += 1
-                    counted.append(i)
-        # Constraint: c2 + x0 + x4 = x4 + 9 + 10 * c3
-        if id_var in [15, 0, 4, 9, 16]:
-            for i in [15, 0, 4, 9, 16]:
-                if i == id_var:
-                    continue
-                if not self.variables[i].is_assigned and i not in counted:
-                    degree += 1
-                    counted.append(i)
-        # Constraint: c3 = x8
-        if id_var in [16, 8]:
-            for i in [16, 8]:
-                if i == id_var:
-                    continue
-                if not self.variables[i].is_assigned and i not in counted:
-                    degree += 1
-                    counted.append(i)
+        if id_var < self.num_positions:
+            degree += self.unassigned_letters
+            if not self.variables[id_var].is_assigned:
+                degree -= 1
 
         return degree
 
     def is_consistent(self, id_var, value, assignment):
+        letter = self.variables[id_var].letter
         # Constraint: All letters must be different
-        shared_letters = []
-
-        if id_var in range(13):
-            assigned_letters = []
-            for i in range(13):
-                if self.variables[i].letter == self.variables[id_var].letter:
-                    shared_letters.append(i)
-                if self.variables[i].letter not in assigned_letters and self.variables[i].is_assigned:
-                    assigned_letters.append(self.variables[i].letter)
-
-            for letter in assigned_letters:
-                if assignment[letter] == value:
+        if id_var < self.num_positions and self.used >> value & 1:
+            return False
+
+        # Every column constraint with the letter is checked once all of its other
+        # letters are assigned
+        for c in self.letter_constraints[letter]:
+            total = 0
+            for other, coef in self.constraint_terms[c]:
+                if other == letter:
+                    total += coef * value
+                elif other in assignment:
+                    total += coef * assignment[other]
+                else:
+                    break
+            else:
+                if self.constraint_products[c]:
+                    total = self.add_products(c, letter, value, assignment, total)
+                    if total is None:
+                        continue
+                if total != 0:
                     return False
+        return True
 
-        for index in shared_letters:
-            # Constraint: x3 + x7 = x12 + 10 * c0
-            constraint_list = [3, 7, 12, 13]
-            if index in constraint_list:
-                cl = constraint_list.copy()
-                cl.remove(index)
-                missing_assigned_var = False
-                for i in cl:
-                    if not self.variables[i].is_assigned:
-                        missing_assigned_var = True
-                        break
-
-                if not missing_assigned_var:
-                    x3, x7, x12, c0 = 0, 0, 0, 0
-
-                    if index == 3:
-                        x3 = value
-                        x7 = assignment[self.variables[7].letter]
-                        x12 = assignment[self.variables[12].letter]
-                        c0 = assignment[self.variables[13].letter]
-                    elif index == 7:
-                        x7 = value
-                        x3 = assignment[self.variables[3].letter]
-                        x12 = assignment[self.variables[12].letter]
-                        c0 = assignment[self.variables[13].letter]
-                    elif index == 12:
-                        x12 = value
-                        x3 = assignment[self.variables[3].letter]
-                        x7 = assignment[self.variables[7].letter]
-                        c0 = assignment[self.variables[13].letter]
-                    elif index == 13:
-                        c0 = value
-                        x3 = assignment[self.variables[3].letter]
-                        x7 = assignment[self.variables[7].letter]
-                        x12 = assignment[self.variables[12].letter]
-
-                    if x3 + x7 != x12 + 10 * c0:
-                        return False
-            # Constraint: c0 + x2 + x6 = x11 + 10 * c1
-            constraint_list = [13, 2, 6, 11, 14]
-            if index in constraint_list:
-                cl = constraint_list.copy()
-                cl.remove(index)
-                missing_assigned_var = False
-                for i in cl:
-                    if not self.variables[i].is_assigned:
-                        missing_assigned_var = True
-                        break
+    # Adds the product terms of the constraint to total, with the value for the letter,
+    # or returns None when one of their letters has no value yet
+    def add_products(self, c, letter, value, assignment, total):
+        for first, second, coef in self.constraint_products[c]:
+            first_value = value if first == letter else assignment.get(first)
+            second_value = value if second == letter else assignment.get(second)
+            if first_value is None or second_value is None:
+                return None
+            total += coef * first_value * second_value
+        return total
+
+    # Terms (letter, coef) of the column c with every product of an assigned letter
+    # replaced by a term of the other one, or None while a product has both letters
+    # unassigned
+    def linear_terms(self, c, assignment):
+        coefs = dict(self.constraint_terms[c])
+        for first, second, coef in self.constraint_products[c]:
+            if first in assignment:
+                coefs[second] = coefs.get(second, 0) + coef * assignment[first]
+            elif second in assignment:
+                coefs[first] = coefs.get(first, 0) + coef * assignment[second]
+            else:
+                return None
+        return coefs.items()
 
-                if not missing_assigned_var:
-                    c0, x2, x6, x11, c1 = 0, 0, 0, 0, 0
-
-                    if index == 13:
-                        c0 = value
-                        x2 = assignment[self.variables[2].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c1 = assignment[self.variables[14].letter]
-                    elif index == 2:
-                        x2 = value
-                        c0 = assignment[self.variables[13].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c1 = assignment[self.variables[14].letter]
-                    elif index == 6:
-                        x6 = value
-                        x2 = assignment[self.variables[2].letter]
-                        c0 = assignment[self.variables[13].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c1 = assignment[self.variables[14].letter]
-                    elif index == 11:
-                        x11 = value
-                        x2 = assignment[self.variables[2].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        c0 = assignment[self.variables[13].letter]
-                        c1 = assignment[self.variables[14].letter]
-                    elif index == 14:
-                        c1 = value
-                        x2 = assignment[self.variables[2].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c0 = assignment[self.variables[13].letter]
-
-                    if c0 + x2 + x6 != x11 + 10 * c1:
-                        return False
-
-            # Constraint: c1 + x1 + x5 = x10 + 10 * c2
-            constraint_list = [14, 1, 5, 10, 15]
-            if index in constraint_list:
-                cl = constraint_list.copy()
-                cl.remove(index)
-                missing_assigned_var = False
-                for i in cl:
-                    if not self.variables[i].is_assigned:
-                        missing_assigned_var = True
-                        break
+    def set_assigned(self, assigned_var):
+        unassigned_neighbours = self.unassigned_neighbours
+        for i in self.letter_positions[assigned_var.letter]:
+            self.variables[i].is_assigned = True
+            self.order.remove(i)
+            for j in self.graph.neighbours[i]:
+                unassigned_neighbours[j] -= 1
+        if not assigned_var.is_carry:
+            self.unassigned_letters -= 1
 
-                if not missing_assigned_var:
-                    c1, x1, x5, x10, c2 = 0, 0, 0, 0, 0
-
-                    if index == 14:
-                        c1 = value
-                        x1 = assignment[self.variables[1].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c2 = assignment[self.variables[15].letter]
-                    elif index == 1:
-                        x1 = value
-                        c1 = assignment[self.variables[14].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c2 = assignment[self.variables[15].letter]
-                    elif index == 5:
-                        x5 = value
-                        x1 = assignment[self.variables[1].letter]
-                        c1 = assignment[self.variables[14].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c2 = assignment[self.variables[15].letter]
-                    elif index == 10:
-                        x10 = value
-                        x1 = assignment[self.variables[1].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        c1 = assignment[self.variables[14].letter]
-                        c2 = assignment[self.variables[15].letter]
-                    elif index == 15:
-                        c2 = value
-                        x1 = assignment[self.variables[1].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c1 = assignment[self.variables[14].letter]
-
-                    if c1 + x1 + x5 != x10 + 10 * c2:
-                        return False
-
-            # Constraint: c2 + x0 + x4 = x9 + 10 * c3
-            constraint_list = [15, 0, 4, 9, 16]
-            if index in constraint_list:
-                cl = constraint_list.copy()
-                cl.remove(index)
-                missing_assigned_var = False
-                for i in cl:
-                    if not self.variables[i].is_assigned:
-                        missing_assigned_var = True
-                        break
+    def set_unassigned(self, unassigned_var):
+        unassigned_neighbours = self.unassigned_neighbours
+        for i in self.letter_positions[unassigned_var.letter]:
+            self.variables[i].is_assigned = False
+            self.order.add(i)
+            for j in self.graph.neighbours[i]:
+                unassigned_neighbours[j] += 1
+        if not unassigned_var.is_carry:
+            self.unassigned_letters += 1
+
+    # Called before set_assigned(var), with assignment already holding the new value
+    def update_domains(self, var, value, assignment):
+        mark = len(self.trail)
+        if self.restrict_letter(var.letter, 1 << value) == 0:
+            return False
 
-                if not missing_assigned_var:
-                    c2, x0, x4, x9, c3 = 0, 0, 0, 0, 0
-
-                    if index == 15:
-                        c2 = value
-                        x0 = assignment[self.variables[0].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c3 = assignment[self.variables[16].letter]
-                    elif index == 0:
-                        x0 = value
-                        c2 = assignment[self.variables[15].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c3 = assignment[self.variables[16].letter]
-                    elif index == 4:
-                        x4 = value
-                        x0 = assignment[self.variables[0].letter]
-                        c2 = assignment[self.variables[15].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c3 = assignment[self.variables[16].letter]
-                    elif index == 9:
-                        x9 = value
-                        x0 = assignment[self.variables[0].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        c2 = assignment[self.variables[15].letter]
-                        c3 = assignment[self.variables[16].letter]
-                    elif index == 16:
-                        c3 = value
-                        x0 = assignment[self.variables[0].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c2 = assignment[self.variables[15].letter]
-
-                    if c2 + x0 + x4 != x9 + 10 * c3:
-                        return False
-
-            # Constraint: c3 = x8
-            constraint_list = [16, 8]
-            if index in constraint_list:
-                cl = constraint_list.copy()
-                cl.remove(index)
-                missing_assigned_var = False
-                for i in cl:
-                    if not self.variables[i].is_assigned:
-                        missing_assigned_var = True
-                        break
+        if not var.is_carry:
+            self.trail.append((CSP.USED, self.used))
+            self.used |= 1 << value
 
-                if not missing_assigned_var:
-                    c3, x8 = 0, 0
+            for letter in self.letters:
+                if letter in assignment:
+                    continue
+                for i in self.letter_positions[letter]:
+                    if self.domains[i] >> value & 1:
+                        self.remove_value(i, value)
+                        if self.stats is not None:
+                            self.stats.pruned('all_different')
+                if self.domains[self.letter_positions[letter][0]] == 0:
+                    return False
 
-                    if index == 16:
-                        c3 = value
-                        x8 = assignment[self.variables[8].letter]
-                    elif index == 8:
-                        x8 = value
-                        c3 = assignment[self.variables[16].letter]
+        if self.propagation != 'forward':
+            changed = set()
+            for i, _ in self.trail[mark:]:
+                if i != CSP.USED:
+                    changed.add(self.variables[i].letter)
+            return self.propagate(changed)
+
+        # When a column has only one letter (or carry) left unassigned, keep the value
+        # of that letter that satisfies the column, if there is one. Columns with
+        # products are turned into such a sum by linear_terms().
+        for c in self.letter_constraints[var.letter]:
+            if self.constraint_products[c]:
+                terms = self.linear_terms(c, assignment)
+                if terms is None:
+                    continue
+            else:
+                terms = self.constraint_terms[c]
+            total = 0
+            unassigned_letter = None
+            unassigned_coef = 0
+            for other, coef in terms:
+                if other in assignment:
+                    total += coef * assignment[other]
+                elif unassigned_letter is None:
+                    unassigned_letter = other
+                    unassigned_coef = coef
+                else:
+                    break
+            else:
+                if unassigned_letter is None or unassigned_coef == 0:
+                    continue
 
-                    if c3 != x8:
-                        return False
+                if total % unassigned_coef == 0 and -total // unassigned_coef >= 0:
+                    allowed = 1 << (-total // unassigned_coef)
+                else:
+                    allowed = 0
+
+                old = self.domains[self.letter_positions[unassigned_letter][0]]
+                new = self.restrict_letter(unassigned_letter, allowed)
+                if new != old and self.stats is not None:
+                    self.stats.pruned(self.constraint_names[c])
+                if new == 0:
+                    if self.strategy is not None:
+                        self.strategy.conflict(c)
+                    return False
         return True
 
-    def set_assigned(self, assigned_var):
-        if assigned_var.id < 13:
-            for i in range(13):
-                if self.variables[i].letter == assigned_var.letter:
-                    self.variables[i].is_assigned = True
-
-        else:
-            self.variables[assigned_var.id].is_assigned = True
-
-    def set_unassigned(self, unassigned_var):
-        if unassigned_var.id < 13:
-            for i in range(13):
-                if self.variables[i].letter == unassigned_var.letter:
-                    self.variables[i].is_assigned = False
-
-        else:
-            self.variables[unassigned_var.id].is_assigned = False
-
-    def update_domains(self, var, value, assignment):
-        if var.id in range(13):
-            for i in range(13):
-                if self.variables[i].letter == var.letter or self.variables[i].is_assigned:
-                    continue
+    # Runs the bounds (and Hall interval) propagation until nothing changes, starting
+    # from the columns of the given letters. Returns False when a domain becomes empty.
+    def propagate(self, letters):
+        if self.propagation == 'forward':
+            return True
+
+        queue = deque()
+        queued = [False] * len(self.constraints)
+        all_different_pending = False
+        for letter in letters:
+            if letter in self.letter_constraints:
+                all_different_pending = all_different_pending or not self.is_carry_letter(letter)
+                for c in self.letter_constraints[letter]:
+                    if not queued[c]:
+                        queued[c] = True
+                        queue.append(c)
+
+        while queue or all_different_pending:
+            while queue:
+                c = queue.popleft()
+                queued[c] = False
+                changed = self.revise_column(c)
+                if changed is None:
+                    if self.strategy is not None:
+                        self.strategy.conflict(c)
+                    return False
+                for letter in changed:
+                    all_different_pending = all_different_pending or not self.is_carry_letter(letter)
+                    for other in self.letter_constraints[letter]:
+                        if other != c and not queued[other]:
+                            queued[other] = True
+                            queue.append(other)
+
+            if all_different_pending:
+                all_different_pending = False
+                changed = self.revise_all_different()
+                if changed is None:
+                    return False
+                for letter in changed:
+                    for other in self.letter_constraints[letter]:
+                        if not queued[other]:
+                            queued[other] = True
+                            queue.append(other)
+        return True
 
-                if value in self.domains[i]:
-                    self.domains[i].remove(value)
-
-        constraint_list = [3, 7, 12, 13]
-        if var.id in constraint_list:
-            cl = constraint_list.copy()
-            cl.remove(var.id)
-            unassigned_vars = 0
-            var_to_assign = None
-            for el in cl:
-                if not self.variables[el].is_assigned:
-                    unassigned_vars += 1
-                    var_to_assign = self.variables[el]
-
-            if unassigned_vars == 1:
-                if var_to_assign.id == 3:
-                    new_domain = self.domains[3].copy()
-                    for val in self.domains[3]:
-                        x3 = val
-                        x7 = assignment[self.variables[7].letter]
-                        x12 = assignment[self.variables[12].letter]
-                        c0 = assignment[self.variables[13].letter]
-
-                        if x3 + x7 != x12 + 10 * c0:
-                            new_domain.remove(val)
-
-                    self.domains[3] = new_domain
-
-                elif var_to_assign.id == 7:
-                    new_domain = self.domains[7].copy()
-                    for val in self.domains[7]:
-                        x7 = val
-                        x3 = assignment[self.variables[3].letter]
-                        x12 = assignment[self.variables[12].letter]
-                        c0 = assignment[self.variables[13].letter]
-
-                        if x3 + x7 != x12 + 10 * c0:
-                            new_domain.remove(val)
-
-                    self.domains[7] = new_domain
-                elif var_to_assign.id == 12:
-                    new_domain = self.domains[12].copy()
-                    for val in self.domains[12]:
-                        x12 = val
-                        x3 = assignment[self.variables[3].letter]
-                        x7 = assignment[self.variables[7].letter]
-                        c0 = assignment[self.variables[13].letter]
-
-                        if x3 + x7 != x12 + 10 * c0:
-                            new_domain.remove(val)
-
-                    self.domains[12] = new_domain
-                elif var_to_assign.id == 13:
-                    new_domain = self.domains[13].copy()
-                    for val in self.domains[13]:
-                        c0 = val
-                        x3 = assignment[self.variables[3].letter]
-                        x7 = assignment[self.variables[7].letter]
-                        x12 = assignment[self.variables[12].letter]
-
-                        if x3 + x7 != x12 + 10 * c0:
-                            new_domain.remove(val)
-
-                    self.domains[13] = new_domain
-
-        constraint_list = [13, 2, 6, 11, 14]
-        if var.id in constraint_list:
-            cl = constraint_list.copy()
-            cl.remove(var.id)
-            unassigned_vars = 0
-            var_to_assign = None
-            for el in cl:
-                if not self.variables[el].is_assigned:
-                    unassigned_vars += 1
-                    var_to_assign = self.variables[el]
-
-            if unassigned_vars == 1:
-                if var_to_assign.id == 13:
-                    new_domain = self.domains[13].copy()
-                    for val in self.domains[13]:
-                        c0 = val
-                        x2 = assignment[self.variables[2].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c1 = assignment[self.variables[14].letter]
-
-                        if c0 + x2 + x6 != x11 + 10 * c1:
-                            new_domain.remove(val)
-
-                    self.domains[13] = new_domain
-
-                elif var_to_assign.id == 2:
-                    new_domain = self.domains[2].copy()
-                    for val in self.domains[2]:
-                        x2 = val
-                        c0 = assignment[self.variables[13].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c1 = assignment[self.variables[14].letter]
-
-                        if c0 + x2 + x6 != x11 + 10 * c1:
-                            new_domain.remove(val)
-
-                    self.domains[2] = new_domain
-                elif var_to_assign.id == 6:
-                    new_domain = self.domains[6].copy()
-                    for val in self.domains[6]:
-                        x6 = val
-                        x2 = assignment[self.variables[2].letter]
-                        c0 = assignment[self.variables[13].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c1 = assignment[self.variables[14].letter]
-
-                        if c0 + x2 + x6 != x11 + 10 * c1:
-                            new_domain.remove(val)
-
-                    self.domains[6] = new_domain
-                elif var_to_assign.id == 11:
-                    new_domain = self.domains[11].copy()
-                    for val in self.domains[11]:
-                        x11 = val
-                        x2 = assignment[self.variables[2].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        c0 = assignment[self.variables[13].letter]
-                        c1 = assignment[self.variables[14].letter]
-
-                        if c0 + x2 + x6 != x11 + 10 * c1:
-                            new_domain.remove(val)
-
-                    self.domains[11] = new_domain
-                elif var_to_assign.id == 14:
-                    new_domain = self.domains[14].copy()
-                    for val in self.domains[14]:
-                        c1 = val
-                        x2 = assignment[self.variables[2].letter]
-                        x6 = assignment[self.variables[6].letter]
-                        x11 = assignment[self.variables[11].letter]
-                        c0 = assignment[self.variables[13].letter]
-
-                        if c0 + x2 + x6 != x11 + 10 * c1:
-                            new_domain.remove(val)
-
-                    self.domains[14] = new_domain
-
-        constraint_list = [14, 1, 5, 10, 15]
-        if var.id in constraint_list:
-            cl = constraint_list.copy()
-            cl.remove(var.id)
-            unassigned_vars = 0
-            var_to_assign = None
-            for el in cl:
-                if not self.variables[el].is_assigned:
-                    unassigned_vars += 1
-                    var_to_assign = self.variables[el]
-
-            if unassigned_vars == 1:
-                if var_to_assign.id == 14:
-                    new_domain = self.domains[14].copy()
-                    for val in self.domains[14]:
-                        c1 = val
-                        x1 = assignment[self.variables[1].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c2 = assignment[self.variables[15].letter]
-
-                        if c1 + x1 + x5 != x10 + 10 * c2:
-                            new_domain.remove(val)
-
-                    self.domains[14] = new_domain
-                elif var_to_assign.id == 1:
-                    new_domain = self.domains[1].copy()
-                    for val in self.domains[1]:
-                        x1 = val
-                        c1 = assignment[self.variables[14].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c2 = assignment[self.variables[15].letter]
-
-                        if c1 + x1 + x5 != x10 + 10 * c2:
-                            new_domain.remove(val)
-
-                    self.domains[1] = new_domain
-                elif var_to_assign.id == 5:
-                    new_domain = self.domains[5].copy()
-                    for val in self.domains[5]:
-                        x5 = val
-                        x1 = assignment[self.variables[1].letter]
-                        c1 = assignment[self.variables[14].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c2 = assignment[self.variables[15].letter]
-
-                        if c1 + x1 + x5 != x10 + 10 * c2:
-                            new_domain.remove(val)
-
-                    self.domains[5] = new_domain
-                elif var_to_assign.id == 10:
-                    new_domain = self.domains[10].copy()
-                    for val in self.domains[10]:
-                        x10 = val
-                        x1 = assignment[self.variables[1].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        c1 = assignment[self.variables[14].letter]
-                        c2 = assignment[self.variables[15].letter]
-
-                        if c1 + x1 + x5 != x10 + 10 * c2:
-                            new_domain.remove(val)
-
-                    self.domains[10] = new_domain
-                elif var_to_assign.id == 15:
-                    new_domain = self.domains[15].copy()
-                    for val in self.domains[15]:
-                        c2 = val
-                        x1 = assignment[self.variables[1].letter]
-                        x5 = assignment[self.variables[5].letter]
-                        x10 = assignment[self.variables[10].letter]
-                        c1 = assignment[self.variables[14].letter]
-
-                        if c1 + x1 + x5 != x10 + 10 * c2:
-                            new_domain.remove(val)
-
-                    self.domains[15] = new_domain
-
-        constraint_list = [15, 0, 4, 9, 16]
-        if var.id in constraint_list:
-            cl = constraint_list.copy()
-            cl.remove(var.id)
-            unassigned_vars = 0
-            var_to_assign = None
-            for el in cl:
-                if not self.variables[el].is_assigned:
-                    unassigned_vars += 1
-                    var_to_assign = self.variables[el]
-
-            if unassigned_vars == 1:
-                if var_to_assign.id == 15:
-                    new_domain = self.domains[15].copy()
-                    for val in self.domains[15]:
-                        c2 = val
-                        x0 = assignment[self.variables[0].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c3 = assignment[self.variables[16].letter]
-
-                        if c2 + x0 + x4 != x9 + 10 * c3:
-                            new_domain.remove(val)
-
-                    self.domains[15] = new_domain
-                elif var_to_assign.id == 0:
-                    new_domain = self.domains[0].copy()
-                    for val in self.domains[0]:
-                        x0 = val
-                        c2 = assignment[self.variables[15].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c3 = assignment[self.variables[16].letter]
-
-                        if c2 + x0 + x4 != x9 + 10 * c3:
-                            new_domain.remove(val)
-
-                    self.domains[0] = new_domain
-                elif var_to_assign.id == 4:
-                    new_domain = self.domains[4].copy()
-                    for val in self.domains[4]:
-                        x4 = val
-                        x0 = assignment[self.variables[0].letter]
-                        c2 = assignment[self.variables[15].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c3 = assignment[self.variables[16].letter]
-
-                        if c2 + x0 + x4 != x9 + 10 * c3:
-                            new_domain.remove(val)
-
-                    self.domains[4] = new_domain
-                elif var_to_assign.id == 9:
-                    new_domain = self.domains[9].copy()
-                    for val in self.domains[9]:
-                        x9 = val
-                        x0 = assignment[self.variables[0].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        c2 = assignment[self.variables[15].letter]
-                        c3 = assignment[self.variables[16].letter]
-
-                        if c2 + x0 + x4 != x9 + 10 * c3:
-                            new_domain.remove(val)
-
-                    self.domains[9] = new_domain
-                elif var_to_assign.id == 16:
-                    new_domain = self.domains[16].copy()
-                    for val in self.domains[16]:
-                        c3 = val
-                        x0 = assignment[self.variables[0].letter]
-                        x4 = assignment[self.variables[4].letter]
-                        x9 = assignment[self.variables[9].letter]
-                        c2 = assignment[self.variables[15].letter]
-
-                        if c2 + x0 + x4 != x9 + 10 * c3:
-                            new_domain.remove(val)
-
-                    self.domains[16] = new_domain
-
-        constraint_list = [16, 8]
-        if var.id in constraint_list:
-            cl = constraint_list.copy()
-            cl.remove(var.id)
-            unassigned_vars = 0
-            var_to_assign = None
-            for el in cl:
-                if not self.variables[el].is_assigned:
-                    unassigned_vars += 1
-                    var_to_assign = self.variables[el]
-
-            if unassigned_vars == 1:
-                if var_to_assign.id == 16:
-                    new_domain = self.domains[16].copy()
-                    for val in self.domains[16]:
-                        c3 = val
-                        x8 = assignment[self.variables[8].letter]
-
-                        if c3 != x8:
-                            new_domain.remove(val)
-
-                    self.domains[16] = new_domain
-                elif var_to_assign.id == 8:
-                    new_domain = self.domains[8].copy()
-                    for val in self.domains[8]:
-                        x8 = val
-                        c3 = assignment[self.variables[16].letter]
-
-                        if c3 != x8:
-                            new_domain.remove(val)
-
-                    self.domains[8] = new_domain
+    def is_carry_letter(self, letter):
+        return self.variables[self.letter_positions[letter][0]].is_carry
+
+    # Bounds consistency for one column sum(coef * x) == 0. Every letter x with a
+    # positive coef must satisfy coef * x = -(sum of the other terms), so its values
+    # are limited by the smallest and biggest sums the other terms can reach (and
+    # the other way around for a negative coef). Repeats until the column does not
+    # change, and returns the letters whose domain changed or None on a wipeout.
+    def revise_column(self, c):
+        if self.column_tables is not None and self.column_tables[c] is not None:
+            return self.revise_table(c)
+        if self.constraint_products[c]:
+            return self.revise_product_column(c)
+        terms = self.constraint_terms[c]
+        positions = self.letter_positions
+        domains = self.domains
+        changed = []
+        progress = True
+        while progress:
+            progress = False
+            low_sum = 0
+            high_sum = 0
+            for letter, coef in terms:
+                domain = domains[positions[letter][0]]
+                if coef > 0:
+                    low_sum += coef * lowest_value(domain)
+                    high_sum += coef * (domain.bit_length() - 1)
+                else:
+                    low_sum += coef * (domain.bit_length() - 1)
+                    high_sum += coef * lowest_value(domain)
+            if low_sum > 0 or high_sum < 0:
+                return None
+
+            for letter, coef in terms:
+                domain = domains[positions[letter][0]]
+                low = lowest_value(domain)
+                high = domain.bit_length() - 1
+                if coef > 0:
+                    others_low = low_sum - coef * low
+                    others_high = high_sum - coef * high
+                    new_low = -(others_high // coef)
+                    new_high = -others_low // coef
+                else:
+                    others_low = low_sum - coef * high
+                    others_high = high_sum - coef * low
+                    new_low = -(-others_low // -coef)
+                    new_high = others_high // -coef
+                if new_low > low or new_high < high:
+                    if self.restrict_letter(letter, range_mask(new_low, new_high)) == 0:
+                        return None
+                    changed.append(letter)
+                    if self.stats is not None:
+                        self.stats.pruned(self.constraint_names[c])
+                    progress = True
+                    break
+        return changed
+
+    # Bounds consistency for a column with products. Every term (coef * x or
+    # coef * x * y, all values being >= 0) has an interval of values, and must stay
+    # within minus the interval of the sum of the other terms. A linear term limits
+    # its letter directly; a product limits each factor by dividing by the bounds of
+    # the other factor. Repeats until the column does not change, and returns the
+    # letters whose domain changed or None on a wipeout.
+    def revise_product_column(self, c):
+        positions = self.letter_positions
+        domains = self.domains
+        terms = [((letter,), coef) for letter, coef in self.constraint_terms[c]]
+        terms += [((first, second), coef) for first, second, coef in self.constraint_products[c]]
+        changed = []
+        progress = True
+        while progress:
+            progress = False
+            lows = []
+            highs = []
+            for letters, coef in terms:
+                low = 1
+                high = 1
+                for letter in letters:
+                    domain = domains[positions[letter][0]]
+                    low *= lowest_value(domain)
+                    high *= domain.bit_length() - 1
+                lows.append(coef * low if coef > 0 else coef * high)
+                highs.append(coef * high if coef > 0 else coef * low)
+            low_sum = sum(lows)
+            high_sum = sum(highs)
+            if low_sum > 0 or high_sum < 0:
+                return None
+
+            for k in range(len(terms)):
+                letters, coef = terms[k]
+                # Bounds of the product of the letters of the term
+                if coef > 0:
+                    term_low = -((high_sum - highs[k]) // coef)
+                    term_high = -(low_sum - lows[k]) // coef
+                else:
+                    term_low = -(-(low_sum - lows[k]) // -coef)
+                    term_high = (high_sum - highs[k]) // -coef
+                for index in range(len(letters)):
+                    letter = letters[index]
+                    domain = domains[positions[letter][0]]
+                    low = lowest_value(domain)
+                    high = domain.bit_length() - 1
+                    if len(letters) == 1:
+                        new_low, new_high = term_low, term_high
+                    else:
+                        other = domains[positions[letters[1 - index]][0]]
+                        other_low = lowest_value(other)
+                        other_high = other.bit_length() - 1
+                        new_low = -(-term_low // other_high) if other_high > 0 else low
+                        new_high = term_high // other_low if other_low > 0 else high
+                        if other_high == 0 and (term_low > 0 or term_high < 0):
+                            return None
+                    if new_low > low or new_high < high:
+                        if self.restrict_letter(letter, range_mask(new_low, new_high)) == 0:
+                            return None
+                        changed.append(letter)
+                        if self.stats is not None:
+                            self.stats.pruned(self.constraint_names[c])
+                        progress = True
+                        break
+                if progress:
+                    break
+        return changed
+
+    # Arc consistency for one column with its table: keeps the tuples of the table
+    # whose values are all in the domains, and then the values used by those tuples.
+    # Returns the letters whose domain changed or None on a wipeout.
+    def revise_table(self, c):
+        letters, supports, unions = self.column_tables[c]
+        positions = self.letter_positions
+        domains = self.domains
+        valid = -1
+        for k in range(len(letters)):
+            domain = domains[positions[letters[k]][0]]
+            allowed = unions[k].get(domain)
+            if allowed is None:
+                allowed = 0
+                rest = domain
+                while rest:
+                    low = rest & -rest
+                    rest ^= low
+                    allowed |= supports[k][low.bit_length() - 1]
+                if len(unions[k]) < 4096:
+                    unions[k][domain] = allowed
+            valid &= allowed
+            if valid == 0:
+                return None
+
+        changed = []
+        for k in range(len(letters)):
+            domain = domains[positions[letters[k]][0]]
+            # A single value is supported by every valid tuple
+            if domain & (domain - 1) == 0:
+                continue
+            value_supports = supports[k]
+            new = 0
+            rest = domain
+            while rest:
+                low = rest & -rest
+                rest ^= low
+                if value_supports[low.bit_length() - 1] & valid:
+                    new |= low
+            if new != domain:
+                self.restrict_letter(letters[k], new)
+                changed.append(letters[k])
+                if self.stats is not None:
+                    self.stats.pruned(self.constraint_names[c])
+        return changed
+
+    # All different propagation on the letters. With 'bounds' and 'table' only the letters
+    # with a single value left are used (Hall intervals of width 1), with 'hall' every interval
+    # between the smallest value of a letter and the biggest value of another one is
+    # checked. Returns the letters whose domain changed or None on a wipeout.
+    def revise_all_different(self):
+        positions = self.letter_positions
+        domains = self.domains
+        width = len(self.letters) if self.propagation == 'hall' else 1
+        changed = []
+        progress = True
+        while progress:
+            progress = False
+            letter_domains = [domains[positions[letter][0]] for letter in self.letters]
+            lows = set()
+            highs = set()
+            for domain in letter_domains:
+                lows.add(lowest_value(domain))
+                highs.add(domain.bit_length() - 1)
+
+            for low in lows:
+                for high in highs:
+                    size = high - low + 1
+                    if size < 1 or size > width:
+                        continue
+                    interval = range_mask(low, high)
+                    inside = 0
+                    for domain in letter_domains:
+                        if domain & ~interval == 0:
+                            inside += 1
+                    if inside > size:
+                        return None
+                    if inside < size:
+                        continue
+
+                    for k in range(len(self.letters)):
+                        domain = letter_domains[k]
+                        if domain & ~interval and domain & interval:
+                            if self.restrict_letter(self.letters[k], ~interval) == 0:
+                                return None
+                            changed.append(self.letters[k])
+                            if self.stats is not None:
+                                self.stats.pruned('all_different')
+                            progress = True
+                    if progress:
+                        break
+                if progress:
+                    break
+        return changed
+
+    # Restricts the domain of every position of the letter, and returns the new domain
+    def restrict_letter(self, letter, mask):
+        for i in self.letter_positions[letter]:
+            self.restrict(i, mask)
+        return self.domains[self.letter_positions[letter][0]]
+
+    def remove_value(self, id_var, value):
+        self.trail.append((id_var, self.domains[id_var]))
+        self.domains[id_var] &= ~(1 << value)
+        self.order.resize(id_var, self.order.sizes[id_var] - 1)
+
+    # Keeps only the values of the domain that are in the mask
+    def restrict(self, id_var, mask):
+        old = self.domains[id_var]
+        if old & mask != old:
+            self.trail.append((id_var, old))
+            self.domains[id_var] = old & mask
+            self.order.resize(id_var, popcount(old & mask))
+
+    def trail_mark(self):
+        return len(self.trail)
+
+    # Puts back every domain changed since the mark, most recent first
+    def undo(self, mark):
+        trail = self.trail
+        domains = self.domains
+        while len(trail) > mark:
+            id_var, old = trail.pop()
+            if id_var == CSP.USED:
+                self.used = old
+            else:
+                domains[id_var] = old
+                self.order.resize(id_var, popcount(old))
@@ -0,0 +1,34 @@
+# This class is the constraint graph of the columns of a puzzle: two variables are
+# neighbours when they appear in the same column. It only depends on the compiled
+# columns, so it is built once and can be shared by every CSP and heuristic of the
+# puzzle. It contains:
+# - constraint_vars: for every column the ids of its variables (the letter
+#   positions and hidden variables, with both factors of a product)
+# - var_constraints: for every variable the indices of the columns it appears in
+# - neighbours: for every variable the ids of the other variables of its columns,
+#   each one once
+# - degree(): number of neighbours of a variable, whether assigned or not
+class ConstraintGraph:
+    def __init__(self, num_variables, constraints):
+        self.constraint_vars = []
+        self.var_constraints = [[] for _ in range(num_variables)]
+        for c, (ids, _) in enumerate(constraints):
+            constraint_vars = []
+            for term in ids:
+                for i in (term if isinstance(term, tuple) else (term,)):
+                    if i not in constraint_vars:
+                        constraint_vars.append(i)
+            self.constraint_vars.append(constraint_vars)
+            for i in constraint_vars:
+                self.var_constraints[i].append(c)
+
+        self.neighbours = []
+        for i in range(num_variables):
+            neighbours = set()
+            for c in self.var_constraints[i]:
+                neighbours.update(self.constraint_vars[c])
+            neighbours.discard(i)
+            self.neighbours.append(tuple(sorted(neighbours)))
+
+    def degree(self, id_var):
+        return len(self.neighbours[id_var])
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+
+# This class records the subproblems the search has proven to have no solution, so
+# the search does not explore them again in another branch. It is attached to a CSP
+# with attach(), and the search engines only use it when csp.nogoods is not None.
+#
+# Once the columns on the right are complete, what is left to solve only depends on
+# the carry into the next column, the digits already used and the values of the
+# letters that share a column with an unassigned variable. Different digits for the
+# letters of the finished columns often leave the same subproblem, and without the
+# store the search fails on it again every time. The key of a node is:
+# - the used mask of the CSP
+# - the domain of every letter and carry that is unassigned, or assigned and in a
+#   column with an unassigned variable (its domain is then its value)
+# - -1 for the other assigned letters, whose value only matters through used
+# Two nodes with the same key have the same solutions for the unassigned variables,
+# so when the subtree of a node fails, its key is a nogood: every node with that key
+# fails without being explored.
+#
+# The store keeps the max_size most recently used nogoods and evicts the oldest one
+# when it is full. It contains:
+# - key(): Key of the current node of the CSP
+# - failed(): Whether a key is a nogood (marks it as recently used)
+# - add(): Records a nogood
+# - hits / added / evicted: counters of the store
+class NogoodStore:
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.nogoods = OrderedDict()
+        self.hits = 0
+        self.added = 0
+        self.evicted = 0
+        self.groups = None
+
+    # Representative variable and constraints of every letter and carry. The keys
+    # only hold masks and domains, so the nogoods of another CSP would prune live
+    # subtrees: the store and its counters start empty on every attach
+    def attach(self, csp):
+        csp.nogoods = self
+        self.nogoods = OrderedDict()
+        self.hits = 0
+        self.added = 0
+        self.evicted = 0
+        self.groups = [(ids[0], csp.letter_constraints[letter]) for letter, ids in csp.letter_positions.items()]
+        return csp
+
+    def key(self, csp):
+        active = csp.order.active
+        domains = csp.domains
+        open_constraints = set()
+        for id_var, constraints in self.groups:
+            if active[id_var]:
+                open_constraints.update(constraints)
+        key = [csp.used]
+        for id_var, constraints in self.groups:
+            if active[id_var] or not open_constraints.isdisjoint(constraints):
+                key.append(domains[id_var])
+            else:
+                key.append(-1)
+        return tuple(key)
+
+    def failed(self, key):
+        if key in self.nogoods:
+            self.nogoods.move_to_end(key)
+            self.hits += 1
+            return True
+        return False
+
+    def add(self, key):
+        self.nogoods[key] = True
+        self.added += 1
+        if len(self.nogoods) > self.max_size:
+            self.nogoods.popitem(last=False)
+            self.evicted += 1
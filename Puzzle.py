@@ -0,0 +1,219 @@
+from Variable import Variable
+
+
+# Digits of the bases up to 36, used to write the solutions
+DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+OPERATORS = ('+', '-', '*')
+
+
+# This class compiles a cryptarithmetic puzzle into the table of column constraints
+# used by CSP. The puzzle is A + B + ... = Z, A - B - ... = Z or A * B = Z in any
+# base. A subtraction is compiled as the addition B + ... + Z = A, and a
+# multiplication as a long multiplication (see _compile_product()). It contains:
+# - operator: '+' or '*', the operator of the compiled puzzle
+# - addends / result: the addends (or factors) and the result of the compiled
+#   puzzle, and words: the addends followed by the result
+# - display_operator / display_words: the puzzle as it was written
+# - letters: the letter of every position, reading the words from left to right.
+#   The variable x_i of the CSP is the i-th position; the hidden variables
+#   c0 ... c(k-1) (carries, and the digits of the partial products of a
+#   multiplication) come after all the positions.
+# - columns: one entry per column, rightmost column first. Every entry is a pair
+#   (ids, coefs) of tuples and means sum(coefs[k] * value(ids[k])) == 0, e.g. the
+#   column D + E = Y + 10 * c0 is ((3, 7, 12, 13), (1, 1, -1, -10)). In a
+#   multiplication an id can also be a pair (i, k), the product x_i * x_k.
+# - carry_bounds: the biggest value each hidden variable can take. For a carry it
+#   depends on the terms of the columns to its right.
+# - leading: ids of the first letter of every word with more than one letter.
+class Puzzle:
+    def __init__(self, addends, result, base=10, operator='+'):
+        if len(addends) == 0:
+            raise ValueError('A puzzle needs at least one addend')
+        if operator not in OPERATORS:
+            raise ValueError('Unknown operator: ' + repr(operator))
+        if base < 2:
+            raise ValueError('The base must be at least 2')
+        for word in addends + [result]:
+            if len(word) == 0 or not word.isalpha():
+                raise ValueError('Invalid word in puzzle: ' + repr(word))
+        if operator == '*' and len(addends) != 2:
+            raise ValueError('A multiplication needs exactly two factors')
+
+        self.display_operator = operator
+        self.display_words = addends + [result]
+        if operator == '-':
+            # A - B - C = Z is B + C + Z = A
+            addends, result = addends[1:] + [result], addends[0]
+            operator = '+'
+            if len(addends) == 1:
+                raise ValueError('A subtraction needs at least two terms')
+        elif operator == '*' and len(addends[1]) > len(addends[0]):
+            # The shorter factor gives fewer partial products
+            addends = [addends[1], addends[0]]
+
+        self.operator = operator
+        self.addends = addends
+        self.result = result
+        self.words = addends + [result]
+        self.base = base
+
+        self.letters = []
+        self.word_ids = []
+        self.leading = []
+        for word in self.words:
+            ids = []
+            for char in word:
+                ids.append(len(self.letters))
+                self.letters.append(char)
+            if len(word) > 1:
+                self.leading.append(ids[0])
+            self.word_ids.append(ids)
+
+        self.num_positions = len(self.letters)
+        self.distinct_letters = sorted(set(self.letters))
+        if len(self.distinct_letters) > base:
+            raise ValueError('The puzzle has more letters than digits in base ' + str(base))
+
+        self.columns = []
+        self.carry_bounds = []
+        if operator == '+':
+            self._compile_columns()
+        else:
+            self._compile_product()
+        self.num_columns = max(len(word) for word in self.words) if operator == '+' else len(self.columns)
+        self.num_carries = len(self.carry_bounds)
+
+    # Parses 'SEND + MORE = MONEY', 'A - B = C', 'AB * C = DEF' or the file layout
+    # with one word per line and the result of the sum on the last line.
+    @staticmethod
+    def parse(text, base=10):
+        text = text.strip()
+        if '=' in text:
+            left, right = text.split('=')
+            operators = [op for op in OPERATORS if op in left]
+            if len(operators) > 1:
+                raise ValueError('A puzzle can only use one operator')
+            operator = operators[0] if operators else '+'
+            addends = [word.strip() for word in left.split(operator)]
+            result = right.strip()
+        else:
+            words = [line.strip() for line in text.splitlines() if line.strip()]
+            if len(words) < 2:
+                raise ValueError('A puzzle needs at least one addend and a result')
+            addends = words[:-1]
+            result = words[-1]
+            operator = '+'
+        return Puzzle(addends, result, base, operator)
+
+    @staticmethod
+    def from_file(filename, base=10):
+        with open(filename, 'r') as file:
+            return Puzzle.parse(file.read(), base)
+
+    def carry_id(self, column):
+        return self.num_positions + column
+
+    def carry_letter(self, column):
+        return 'c' + str(column)
+
+    # Adds a hidden variable with values 0 ... bound and returns its id
+    def _new_hidden(self, bound):
+        self.carry_bounds.append(bound)
+        return self.carry_id(len(self.carry_bounds) - 1)
+
+    # Adds the columns of sum(terms) == target, where terms[j] lists the terms of
+    # column j as (id or (i, k) pair, biggest value) and target_ids are the ids of
+    # the digits of the target, leftmost first. Column j adds its terms plus the
+    # carry coming from column j - 1, and must be equal to the j-th digit of the
+    # target plus base times the carry going to column j + 1. The last column has
+    # no carry going out, so it must be 0.
+    def _compile_sum(self, terms, target_ids):
+        num_columns = max(len(terms), len(target_ids))
+        carry_in = None
+        carry_in_bound = 0
+        for j in range(num_columns):
+            ids = []
+            coefs = []
+            high = carry_in_bound
+            if j < len(terms):
+                for term, term_high in terms[j]:
+                    ids.append(term)
+                    coefs.append(1)
+                    high += term_high
+            if carry_in is not None:
+                ids.append(carry_in)
+                coefs.append(1)
+            if j < len(target_ids):
+                ids.append(target_ids[-1 - j])
+                coefs.append(-1)
+            if j < num_columns - 1:
+                carry_in_bound = high // self.base
+                carry_in = self._new_hidden(carry_in_bound)
+                ids.append(carry_in)
+                coefs.append(-self.base)
+            self.columns.append((tuple(ids), tuple(coefs)))
+
+    # Column j adds the j-th digit from the right of every addend (see _compile_sum)
+    def _compile_columns(self):
+        digit_high = self.base - 1
+        num_columns = max(len(word) for word in self.words)
+        terms = [[] for _ in range(num_columns)]
+        for word_ids in self.word_ids[:-1]:
+            for j in range(len(word_ids)):
+                terms[j].append((word_ids[-1 - j], digit_high))
+        self._compile_sum(terms, self.word_ids[-1])
+
+    # Long multiplication X * Y = Z: the partial product P_b = X * y_b of every digit
+    # y_b of Y gets hidden digits, with the columns x_a * y_b + carry = p_(b,a) +
+    # base * carry, and then the partial products shifted by b digits add up to Z.
+    # When Y has a single digit, its partial product is Z itself.
+    def _compile_product(self):
+        x_ids, y_ids = self.word_ids[0], self.word_ids[1]
+        digit_high = self.base - 1
+        product_high = digit_high * digit_high
+        if len(y_ids) == 1:
+            terms = [[((x_ids[-1 - a], y_ids[0]), product_high)] for a in range(len(x_ids))]
+            self._compile_sum(terms, self.word_ids[-1])
+            return
+
+        partial_ids = []
+        for b in range(len(y_ids)):
+            digits = [self._new_hidden(digit_high) for _ in range(len(x_ids) + 1)]
+            terms = [[((x_ids[-1 - a], y_ids[-1 - b]), product_high)] for a in range(len(x_ids))]
+            self._compile_sum(terms, digits)
+            partial_ids.append(digits)
+
+        terms = [[] for _ in range(len(x_ids) + len(y_ids))]
+        for b in range(len(y_ids)):
+            for a in range(len(x_ids) + 1):
+                terms[a + b].append((partial_ids[b][-1 - a], digit_high))
+        self._compile_sum(terms, self.word_ids[-1])
+
+    def variables(self):
+        variables = []
+        for i in range(self.num_positions):
+            variables.append(Variable(letter=self.letters[i], iden=i))
+        for j in range(self.num_carries):
+            variables.append(Variable(letter=self.carry_letter(j), iden=self.carry_id(j), is_carry=True))
+        return variables
+
+    # Writes a digit: with the characters of DIGITS up to base 36, and in decimal
+    # between parentheses above it
+    def format_digit(self, digit):
+        if self.base <= len(DIGITS):
+            return DIGITS[digit]
+        return '(' + str(digit) + ')'
+
+    # Turns an assignment {letter: digit} into the words written with digits, in
+    # the order the puzzle was written
+    def format_solution(self, assignment):
+        lines = []
+        for word in self.display_words:
+            lines.append(''.join(self.format_digit(assignment[char]) for char in word))
+        return lines
+
+    # The puzzle written with digits, e.g. 9567+1085=10652
+    def format_equation(self, assignment):
+        numbers = self.format_solution(assignment)
+        return self.display_operator.join(numbers[:-1]) + '=' + numbers[-1]
+
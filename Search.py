@@ -0,0 +1,254 @@
+import json
+import time
+import main
+import packed
+
+
+# This class is the iterative version of backtrack(): the recursion is replaced by an
+# explicit stack of decisions, preallocated with one frame per variable, so the depth
+# of the search is not limited by the recursion limit of Python. Every frame holds:
+# - frame_var: id of the variable chosen at that depth
+# - frame_value: value the variable has now, or -1 when it has none
+# - frame_remaining: bitmask of the values of the variable not tried yet
+# - frame_mark: trail mark of the CSP taken before assigning the value
+# - frame_key: key of the node in the NogoodStore of the CSP, or None
+# - frame_order: values of the variable in the order of the Strategy of the CSP, or
+#   None to try them from the lowest to the highest
+# It contains:
+# - nodes: values assigned, that is, values that passed is_consistent() and were
+#   propagated, the same count as Stats.nodes
+# - run(): Continues the search until a solution is found (returns the assignment),
+#   the tree is exhausted (returns 'failure'), max_nodes more nodes were explored
+#   (returns 'paused') or the time.monotonic() deadline passed (returns 'timeout').
+#   Both are checked before choosing a variable, so a run can go over max_nodes by
+#   the values of one variable. The clock is only read every 256 variables chosen.
+#   Calling run() again after a solution continues with the next one, and after a
+#   pause or a timeout resumes where the search stopped.
+# - best: copy of the assignment with the most variables seen so far, the best
+#   partial assignment when the search stops before a solution.
+# - solve(): run() with the restarts of the Strategy of the CSP, if it has one.
+# - restart(): Takes back every decision, so the next run() starts from the root.
+# - get_state() / from_state(): The state of the search as a dict of ints and lists
+#   that can be stored as JSON, and a new search rebuilt from it by replaying the
+#   decisions on a new CSP of the same puzzle. Every decision keeps the value order
+#   of its frame, and whether it has a nogood key, which is computed again on the
+#   new CSP since it only depends on the node.
+# - save() / load(): get_state() and from_state() with a JSON file, to checkpoint
+#   long-running solves.
+# - pack() / from_packed(): The node on top of the stack in the binary encoding of
+#   packed.py, and a new search of the subtree of a packed node. Unlike get_state(),
+#   the state holds the domains instead of the decisions, so nothing is replayed, but
+#   the values left to try above the node are not kept.
+class Search:
+    def __init__(self, csp):
+        self.csp = csp
+        self.assignment = {}
+        size = len(csp.variables) + 1
+        self.frame_var = [0] * size
+        self.frame_value = [-1] * size
+        self.frame_remaining = [0] * size
+        self.frame_mark = [0] * size
+        self.frame_key = [None] * size
+        self.frame_order = [None] * size
+        self.depth = 0
+        self.nodes = 0
+        # Variables chosen, to read the clock every 256 of them
+        self.steps = 0
+        # True when the next step chooses a new variable, False when it tries the next
+        # value of the variable on top of the stack
+        self.descend = True
+        self.exhausted = False
+        self.best = {}
+
+    # Takes back the value of the variable on top of the stack
+    def _unassign_top(self):
+        top = self.depth - 1
+        if self.frame_value[top] >= 0:
+            var = self.csp.variables[self.frame_var[top]]
+            self.csp.set_unassigned(var)
+            if self.csp.stats is not None:
+                self.csp.stats.backtrack(len(self.assignment), var, self.frame_value[top])
+            self.assignment.pop(var.letter)
+            self.csp.undo(self.frame_mark[top])
+            self.frame_value[top] = -1
+
+    # Tries to assign the value to the variable on top of the stack
+    def _assign_top(self, value):
+        csp = self.csp
+        top = self.depth - 1
+        var = csp.variables[self.frame_var[top]]
+        if not csp.is_consistent(var.id, value, self.assignment):
+            return False
+        self.assignment[var.letter] = value
+        mark = csp.trail_mark()
+        self.nodes += 1
+        if csp.stats is not None:
+            csp.stats.node(len(self.assignment), var, value)
+        if not csp.update_domains(var, value, self.assignment):
+            if csp.stats is not None:
+                csp.stats.wipeout(len(self.assignment), var, value)
+            self.assignment.pop(var.letter)
+            csp.undo(mark)
+            return False
+        csp.set_assigned(var)
+        self.frame_value[top] = value
+        self.frame_mark[top] = mark
+        if len(self.assignment) > len(self.best):
+            self.best = dict(self.assignment)
+        return True
+
+    def run(self, max_nodes=None, deadline=None):
+        csp = self.csp
+        limit = None if max_nodes is None else self.nodes + max_nodes
+        while not self.exhausted:
+            if self.descend:
+                if csp.assignment_is_complete():
+                    self.descend = False
+                    if csp.stats is not None:
+                        csp.stats.solution(self.assignment)
+                    # The nodes above a solution did not fail
+                    for k in range(self.depth):
+                        self.frame_key[k] = None
+                    return self.assignment
+                if limit is not None and self.nodes >= limit:
+                    return 'paused'
+                if deadline is not None and self.steps & 255 == 0 and time.monotonic() >= deadline:
+                    return 'timeout'
+                key = None
+                if csp.nogoods is not None:
+                    key = csp.nogoods.key(csp)
+                if key is not None and csp.nogoods.failed(key):
+                    self.descend = False
+                else:
+                    if csp.stats is None:
+                        var = main.select_unassigned_variable(csp)
+                    else:
+                        var = csp.stats.select(main.select_unassigned_variable, csp)
+                    top = self.depth
+                    self.frame_var[top] = var.id
+                    self.frame_value[top] = -1
+                    self.frame_remaining[top] = csp.domains[var.id]
+                    self.frame_key[top] = key
+                    if csp.strategy is not None:
+                        self.frame_order[top] = csp.strategy.values(csp, var, self.assignment)
+                    self.depth += 1
+                    self.steps += 1
+
+            if self.depth == 0:
+                self.exhausted = True
+                break
+
+            self._unassign_top()
+            top = self.depth - 1
+            remaining = self.frame_remaining[top]
+            self.descend = False
+            order = self.frame_order[top]
+            while remaining:
+                if order is None:
+                    low = remaining & -remaining
+                else:
+                    low = next((1 << value for value in order if remaining >> value & 1), remaining & -remaining)
+                remaining ^= low
+                if self._assign_top(low.bit_length() - 1):
+                    self.descend = True
+                    break
+            self.frame_remaining[top] = remaining
+            if not self.descend:
+                if self.frame_key[top] is not None:
+                    csp.nogoods.add(self.frame_key[top])
+                self.depth -= 1
+                if self.depth == 0:
+                    self.exhausted = True
+
+        return 'failure'
+
+    # Runs the search with the restarts of the strategy of the CSP: after the cutoff of
+    # restart i the search starts again from the root, with the weights and the random
+    # ties learned so far. A run that exhausts the tree proves there is no solution,
+    # since every run starts from the root. max_nodes and deadline are the budget of
+    # the whole search, as in run().
+    def solve(self, max_nodes=None, deadline=None):
+        strategy = self.csp.strategy
+        if strategy is None or strategy.restarts is None:
+            return self.run(max_nodes, deadline)
+        limit = None if max_nodes is None else self.nodes + max_nodes
+        while True:
+            cutoff = strategy.cutoff(strategy.num_restarts)
+            if limit is not None:
+                cutoff = min(cutoff, limit - self.nodes)
+            solved = self.run(cutoff, deadline)
+            if solved != 'paused' or (limit is not None and self.nodes >= limit):
+                return solved
+            self.restart()
+            strategy.num_restarts += 1
+
+    def restart(self):
+        while self.depth > 0:
+            self._unassign_top()
+            self.depth -= 1
+        self.descend = True
+        self.exhausted = False
+
+    def get_state(self):
+        decisions = []
+        for k in range(self.depth):
+            decisions.append([self.frame_var[k], self.frame_value[k], self.frame_remaining[k], self.frame_order[k],
+                              self.frame_key[k] is not None])
+        return {
+            'decisions': decisions,
+            'nodes': self.nodes,
+            'descend': self.descend,
+            'exhausted': self.exhausted,
+        }
+
+    # The csp must be a new CSP of the same puzzle, with the same propagation, hooks
+    # and already propagated. A state of three fields per decision, from before the
+    # orders were kept, gets the orders and keys of the hooks of the csp.
+    @staticmethod
+    def from_state(csp, state):
+        search = Search(csp)
+        for decision in state['decisions']:
+            id_var, value, remaining = decision[:3]
+            if len(decision) > 3:
+                order, has_key = decision[3:5]
+            else:
+                order = None
+                if csp.strategy is not None:
+                    order = csp.strategy.values(csp, csp.variables[id_var], search.assignment)
+                has_key = True
+            top = search.depth
+            search.frame_var[top] = id_var
+            search.frame_value[top] = -1
+            search.frame_remaining[top] = remaining
+            search.frame_order[top] = order
+            search.frame_key[top] = None
+            if has_key and csp.nogoods is not None:
+                search.frame_key[top] = csp.nogoods.key(csp)
+            search.depth += 1
+            if value >= 0 and not search._assign_top(value):
+                raise ValueError('The state does not belong to this puzzle')
+        search.nodes = state['nodes']
+        search.descend = state['descend']
+        search.exhausted = state['exhausted']
+        return search
+
+    def save(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.get_state(), file)
+
+    @staticmethod
+    def load(csp, filename):
+        with open(filename, 'r') as file:
+            return Search.from_state(csp, json.load(file))
+
+    def pack(self, itemsize):
+        return packed.pack(self.csp, itemsize)
+
+    # The csp must be a new CSP of the same puzzle, with the same propagation. The
+    # search only explores the subtree of the packed node.
+    @staticmethod
+    def from_packed(csp, buffer):
+        search = Search(csp)
+        search.assignment = packed.restore(csp, buffer)
+        search.best = dict(search.assignment)
+        return search
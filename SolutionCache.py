@@ -0,0 +1,129 @@
+import json
+import sqlite3
+from math import factorial
+from itertools import groupby, permutations, product
+from collections import OrderedDict
+
+
+# This class caches the results of solved puzzles, including 'failure'. Puzzles that
+# only differ in the names of their letters or in the order of their addends share
+# the same entry. It contains:
+# - canonical(): Returns the key of a puzzle and its letters in canonical order. The
+#   addends are sorted by their own letter pattern (e.g. SEND and TOLD are both
+#   0.1.2.3), then every letter is replaced by its index of first appearance in the
+#   sorted addends followed by the result. The addends with the same pattern are
+#   tried in every order and the smallest key is kept, so SEND + MORE = MONEY,
+#   MORE + SEND = MONEY and AEND + ZORE = ZONEY give the same key. Past max_orders
+#   orders (many addends with the same pattern) those addends are sorted by their
+#   letters instead, and renamed puzzles may get different keys.
+# - get(): Returns the cached solution with the letters of the puzzle, 'failure', or
+#   None when the puzzle is not cached.
+# - put(): Stores the result of a puzzle as the digits of its canonical letters.
+# It is used by passing it as the cache of main.solve_puzzle().
+# The memory tier keeps the max_size most recently used entries. When path is given,
+# every entry is also stored in an SQLite file, which is looked up on a memory miss
+# and survives between runs.
+class SolutionCache:
+    def __init__(self, max_size=1024, path=None):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.execute('CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, value TEXT)')
+            self.db.commit()
+
+    @staticmethod
+    def pattern(word):
+        first = {}
+        for char in word:
+            if char not in first:
+                first[char] = len(first)
+        return tuple(first[char] for char in word)
+
+    # Key of the puzzle with the addends in the given order
+    @staticmethod
+    def relabel(puzzle, addends):
+        order = []
+        index = {}
+        words = []
+        for word in addends + [puzzle.result]:
+            for char in word:
+                if char not in index:
+                    index[char] = len(order)
+                    order.append(char)
+            words.append('.'.join(str(index[char]) for char in word))
+        key = str(puzzle.base) + ':' + puzzle.operator.join(words[:-1]) + '=' + words[-1]
+        return key, order
+
+    @staticmethod
+    def shape(word):
+        return len(word), SolutionCache.pattern(word)
+
+    @staticmethod
+    def canonical(puzzle, max_orders=5040):
+        addends = sorted(puzzle.addends, key=SolutionCache.shape)
+        groups = [list(group) for _, group in groupby(addends, key=SolutionCache.shape)]
+        orders = 1
+        for group in groups:
+            orders *= factorial(len(group))
+        if orders > max_orders:
+            return SolutionCache.relabel(puzzle, sorted(addends, key=lambda word: (SolutionCache.shape(word), word)))
+
+        # The addends with the same length and pattern are tried in every order, and
+        # the smallest key wins, so it does not depend on the names of the letters
+        best = None
+        for choice in product(*(permutations(group) for group in groups)):
+            candidate = SolutionCache.relabel(puzzle, [word for group in choice for word in group])
+            if best is None or candidate[0] < best[0]:
+                best = candidate
+        return best
+
+    def _lookup(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.db is not None:
+            row = self.db.execute('SELECT value FROM solutions WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value)
+                return value
+        return None
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get(self, puzzle):
+        key, order = SolutionCache.canonical(puzzle)
+        value = self._lookup(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if value == 'failure':
+            return 'failure'
+        digits = dict(zip(order, value))
+        return {letter: digits[letter] for letter in puzzle.distinct_letters}
+
+    def put(self, puzzle, solved):
+        key, order = SolutionCache.canonical(puzzle)
+        if solved == 'failure':
+            value = 'failure'
+        else:
+            value = [solved[letter] for letter in order]
+        self._remember(key, value)
+        if self.db is not None:
+            self.db.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?)', (key, json.dumps(value)))
+            self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
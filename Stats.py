@@ -0,0 +1,118 @@
+import json
+import time
+
+
+# This class collects statistics of a search. It is attached to a CSP with attach(),
+# and the search engines and the CSP only call it when csp.stats is not None, so a
+# search without statistics only pays for that check. It contains:
+# - nodes: values assigned, backtracks: values taken back after their subtree failed,
+#   wipeouts: values whose propagation emptied a domain, solutions: solutions found
+# - prunings: number of domain reductions made by every constraint ('column j' or
+#   'all_different')
+# - depth_histogram: nodes at every depth, only when depth_histogram is True
+# - times: seconds spent in is_consistent(), update_domains(), propagate() and
+#   select_unassigned_variable(), only when timing is True. The methods of the CSP
+#   are wrapped when the Stats is attached, so without timing they are not touched.
+#   The times are exclusive: update_domains() calls propagate(), and that time only
+#   counts for propagate(), so no time is counted twice.
+# - callback: function called as callback(event, data) for the events 'node',
+#   'wipeout', 'backtrack' and 'solution', when it is not None
+# - to_dict() / to_json(): the statistics as a dict or a JSON string
+class Stats:
+    TIMED_METHODS = ('is_consistent', 'update_domains', 'propagate')
+
+    def __init__(self, depth_histogram=False, timing=False, callback=None):
+        self.nodes = 0
+        self.backtracks = 0
+        self.wipeouts = 0
+        self.solutions = 0
+        self.max_depth = 0
+        self.prunings = {}
+        self.depth_histogram = [] if depth_histogram else None
+        self.timing = timing
+        self.times = {}
+        self.callback = callback
+        # Time of the timed calls made inside the timed calls that are running, one
+        # entry per level
+        self._nested = [0.0]
+
+    def attach(self, csp):
+        csp.stats = self
+        if self.timing:
+            for name in Stats.TIMED_METHODS:
+                setattr(csp, name, self._timed(name, getattr(csp, name)))
+        return csp
+
+    def _timed(self, name, method):
+        self.times[name] = 0.0
+        times = self.times
+        nested = self._nested
+
+        def timed(*args):
+            nested.append(0.0)
+            start = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                times[name] += elapsed - nested.pop()
+                nested[-1] += elapsed
+        return timed
+
+    # Calls select(csp), timing it when timing is True
+    def select(self, select, csp):
+        if not self.timing:
+            return select(csp)
+        start = time.perf_counter()
+        try:
+            return select(csp)
+        finally:
+            self.times['select_unassigned_variable'] = \
+                self.times.get('select_unassigned_variable', 0.0) + time.perf_counter() - start
+
+    def node(self, depth, var, value):
+        self.nodes += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if self.depth_histogram is not None:
+            while len(self.depth_histogram) <= depth:
+                self.depth_histogram.append(0)
+            self.depth_histogram[depth] += 1
+        if self.callback is not None:
+            self.callback('node', {'depth': depth, 'letter': var.letter, 'value': value})
+
+    def wipeout(self, depth, var, value):
+        self.wipeouts += 1
+        if self.callback is not None:
+            self.callback('wipeout', {'depth': depth, 'letter': var.letter, 'value': value})
+
+    def backtrack(self, depth, var, value):
+        self.backtracks += 1
+        if self.callback is not None:
+            self.callback('backtrack', {'depth': depth, 'letter': var.letter, 'value': value})
+
+    def solution(self, assignment):
+        self.solutions += 1
+        if self.callback is not None:
+            self.callback('solution', {'assignment': dict(assignment)})
+
+    def pruned(self, constraint):
+        self.prunings[constraint] = self.prunings.get(constraint, 0) + 1
+
+    def to_dict(self):
+        result = {
+            'nodes': self.nodes,
+            'backtracks': self.backtracks,
+            'wipeouts': self.wipeouts,
+            'solutions': self.solutions,
+            'max_depth': self.max_depth,
+            'prunings': dict(self.prunings),
+        }
+        if self.depth_histogram is not None:
+            result['depth_histogram'] = list(self.depth_histogram)
+        if self.timing:
+            result['times'] = dict(self.times)
+        return result
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
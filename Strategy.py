@@ -0,0 +1,169 @@
+import random
+from bitmask import values_of, lowest_value
+
+
+# Luby sequence 1 1 2 1 1 2 4 1 1 2 1 1 2 4 8 ...: the cutoff of restart i is
+# unit * luby(i)
+def luby(i):
+    i += 1
+    while True:
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+# This class holds the heuristics of a search besides the default MRV + degree with
+# values from the lowest to the highest. It is attached to a CSP with attach(), and
+# the search engines only use it when csp.strategy is not None. It contains:
+# - variable_order: 'mrv' (MRV, then degree), or 'domwdeg': the smallest domain size
+#   divided by the weighted degree, the sum of the weights of the columns of the
+#   variable that still have another unassigned variable. The CSP calls conflict()
+#   when a column empties a domain, which adds 1 to its weight, so the search goes
+#   first for the variables of the columns that failed most.
+# - value_order: 'lex' (lowest first), 'lcv' (least constraining value: the values
+#   that leave the most slack in the columns of the variable, that is the distance
+#   from 0 to the nearest bound of sum(coef * x) once the variable takes the value,
+#   go first), or 'carry': the values of a carry go in the order of how close 0 is
+#   to the middle of the bounds of its columns, so the carry the other letters imply
+#   is tried first, and letters go lowest first.
+# - seed: when not None, the ties of both orders are broken at random with a
+#   random.Random(seed) instead of by the lowest id or value.
+# - restarts: None, 'luby' or 'geometric'. Search.solve() stops the search after the
+#   cutoff of the schedule (restart_base nodes times luby(i), or restart_base times
+#   restart_factor ** i) and starts again from the root, keeping the weights and the
+#   random generator, so every run orders the variables in a new way. num_restarts
+#   counts the restarts of the search of the CSP the strategy was last attached to.
+# The columns with products (multiplications) are left out of the slack of 'lcv' and
+# 'carry'.
+class Strategy:
+    VARIABLE_ORDERS = ('mrv', 'domwdeg')
+    VALUE_ORDERS = ('lex', 'lcv', 'carry')
+    RESTARTS = (None, 'luby', 'geometric')
+
+    def __init__(self, variable_order='mrv', value_order='lex', seed=None, restarts=None, restart_base=100,
+                 restart_factor=1.5):
+        if variable_order not in Strategy.VARIABLE_ORDERS:
+            raise ValueError('Unknown variable order: ' + repr(variable_order))
+        if value_order not in Strategy.VALUE_ORDERS:
+            raise ValueError('Unknown value order: ' + repr(value_order))
+        if restarts not in Strategy.RESTARTS:
+            raise ValueError('Unknown restarts: ' + repr(restarts))
+        self.variable_order = variable_order
+        self.value_order = value_order
+        self.random = None if seed is None else random.Random(seed)
+        self.restarts = restarts
+        self.restart_base = restart_base
+        self.restart_factor = restart_factor
+        self.weights = []
+        self.num_restarts = 0
+
+    def attach(self, csp):
+        csp.strategy = self
+        self.weights = [1] * len(csp.constraints)
+        self.num_restarts = 0
+        return csp
+
+    def conflict(self, c):
+        self.weights[c] += 1
+
+    # Nodes of the run after restart i, or None for a search without restarts
+    def cutoff(self, i):
+        if self.restarts == 'luby':
+            return self.restart_base * luby(i)
+        if self.restarts == 'geometric':
+            return int(self.restart_base * self.restart_factor ** i)
+        return None
+
+    # The element of the ties picked at random, or the lowest one
+    def pick(self, ties):
+        if self.random is None or len(ties) == 1:
+            return min(ties)
+        return self.random.choice(sorted(ties))
+
+    def select(self, csp):
+        if self.variable_order == 'domwdeg':
+            return csp.variables[self.select_domwdeg(csp)]
+
+        smallest = csp.order.smallest()
+        if len(smallest) == 1:
+            for i in smallest:
+                return csp.variables[i]
+        max_degree = -1
+        ties = []
+        for i in smallest:
+            degree = csp.get_degree(i)
+            if degree > max_degree:
+                max_degree = degree
+                ties = [i]
+            elif degree == max_degree:
+                ties.append(i)
+        return csp.variables[self.pick(ties)]
+
+    def select_domwdeg(self, csp):
+        weights = self.weights
+        variables = csp.variables
+        graph = csp.graph
+        best = None
+        ties = []
+        for bucket in csp.order.buckets:
+            for i in bucket:
+                weighted_degree = 0
+                for c in graph.var_constraints[i]:
+                    for other in graph.constraint_vars[c]:
+                        if other != i and not variables[other].is_assigned:
+                            weighted_degree += weights[c]
+                            break
+                # dom / wdeg, compared without dividing
+                score = (csp.order.sizes[i], max(weighted_degree, 1))
+                if best is None or score[0] * best[1] < best[0] * score[1]:
+                    best = score
+                    ties = [i]
+                elif score[0] * best[1] == best[0] * score[1]:
+                    ties.append(i)
+        return self.pick(ties)
+
+    # Bounds (low, high) of sum(coef * x) over the column c when the letter takes the
+    # value and the other letters keep their domains
+    def column_bounds(self, csp, c, letter, value):
+        low = 0
+        high = 0
+        for other, coef in csp.constraint_terms[c]:
+            if other == letter:
+                other_low = other_high = value
+            else:
+                domain = csp.domains[csp.letter_positions[other][0]]
+                other_low = lowest_value(domain)
+                other_high = domain.bit_length() - 1
+            if coef > 0:
+                low += coef * other_low
+                high += coef * other_high
+            else:
+                low += coef * other_high
+                high += coef * other_low
+        return low, high
+
+    # Values of the variable in the order they are tried
+    def values(self, csp, var, assignment):
+        values = list(values_of(csp.domains[var.id]))
+        if len(values) == 1 or self.value_order == 'lex' or (self.value_order == 'carry' and not var.is_carry):
+            return values
+
+        columns = [c for c in csp.letter_constraints[var.letter] if not csp.constraint_products[c]]
+        keys = {}
+        for value in values:
+            infeasible = 0
+            score = 0
+            for c in columns:
+                low, high = self.column_bounds(csp, c, var.letter, value)
+                if low > 0 or high < 0:
+                    infeasible += 1
+                elif self.value_order == 'lcv':
+                    score -= min(-low, high)
+                else:
+                    score += abs(low + high)
+            keys[value] = (infeasible, score, 0 if self.random is None else self.random.random())
+        values.sort(key=keys.__getitem__)
+        return values
@@ -2,11 +2,15 @@
 # - ID: index in variables list in CSP
 # - Letter: corresponding letter
 # - Is_assigned: flag to show variable is assigned a value in the assignment
+# - Is_carry: flag to show variable is an auxiliary carry and not a letter
 class Variable:
-    def __init__(self, letter, iden):
+    __slots__ = ('letter', 'id', 'is_assigned', 'is_carry')
+
+    def __init__(self, letter, iden, is_carry=False):
         self.letter = letter
         self.id = iden
         self.is_assigned = False
+        self.is_carry = is_carry
 
     def __lt__(self, other):
         return False
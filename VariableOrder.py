@@ -0,0 +1,52 @@
+# This class keeps the unassigned variables of a CSP grouped by the size of their
+# domain, so the variables with the Minimum Remaining Values are found without
+# looking at every variable. It contains:
+# - buckets: buckets[s] is the set of ids of the unassigned variables with s values
+# - sizes: current domain size of every variable, assigned or not
+# - resize(): Moves a variable to the bucket of its new domain size. CSP calls it
+#   every time a domain changes, and only then.
+# - remove() / add(): Take a variable out of the buckets when it is assigned and
+#   put it back when it is unassigned.
+# - smallest(): Returns the non-empty bucket with the smallest domain size. The
+#   number of buckets is bounded by the base, so this does not grow with the
+#   number of variables.
+class VariableOrder:
+    def __init__(self, sizes):
+        self.sizes = list(sizes)
+        self.buckets = [set() for _ in range(max(self.sizes, default=0) + 1)]
+        self.active = [True] * len(self.sizes)
+        self.count = len(self.sizes)
+        for i in range(len(self.sizes)):
+            self.buckets[self.sizes[i]].add(i)
+
+    def resize(self, id_var, new_size):
+        if self.active[id_var]:
+            self.buckets[self.sizes[id_var]].discard(id_var)
+            self.buckets[new_size].add(id_var)
+        self.sizes[id_var] = new_size
+
+    def remove(self, id_var):
+        if self.active[id_var]:
+            self.active[id_var] = False
+            self.buckets[self.sizes[id_var]].discard(id_var)
+            self.count -= 1
+
+    def add(self, id_var):
+        if not self.active[id_var]:
+            self.active[id_var] = True
+            self.buckets[self.sizes[id_var]].add(id_var)
+            self.count += 1
+
+    def smallest(self):
+        for bucket in self.buckets:
+            if bucket:
+                return bucket
+        return set()
+
+    def __deepcopy__(self, memo):
+        new_order = VariableOrder.__new__(VariableOrder)
+        new_order.sizes = list(self.sizes)
+        new_order.buckets = [set(bucket) for bucket in self.buckets]
+        new_order.active = list(self.active)
+        new_order.count = self.count
+        return new_order
@@ -0,0 +1,202 @@
+# Batch mode: solves many puzzles across a pool of processes and writes one JSON
+# line per puzzle to a single output stream.
+# Usage: python batch.py INPUT [INPUT ...] [-o OUTPUT] [-w WORKERS] [-c CHUNK_SIZE]
+#        [--cache-size N] [--cache-file FILE] [--time-limit SECONDS] [--max-nodes N]
+#        [--base B]
+#
+# Every INPUT can be:
+# - a directory: every file in it is a puzzle in the format of test.txt
+# - a glob pattern such as 'puzzles/*.txt': every matching file is a puzzle
+# - a .jsonl file, or '-' for stdin: one JSON object per line with the puzzle in
+#   'puzzle' (e.g. "SEND + MORE = MONEY" or "SEND\nMORE\nMONEY") and an optional 'id'
+#   A line that is not such an object gets an 'error' record and the batch goes on.
+# Every puzzle is read in the base given by --base (10 by default).
+#
+# Every output line has the id, the puzzle, the status ('solved', 'failure' or
+# 'error'), the solution as {letter: digit}, the error message if any, and the time
+# spent solving the puzzle in seconds. With --time-limit or --max-nodes, a puzzle that
+# runs out of its budget gets the status 'time_limit' or 'node_limit', and the nodes
+# explored and the best 'partial' assignment, instead of stalling its worker.
+#
+# The parent only reads the raw text of the puzzles: parsing, building the CSP and
+# solving happen in the workers. Puzzles are sent in chunks of chunk_size, and at most
+# a few chunks per worker are in flight, so the input is never read all at once.
+#
+# Every worker keeps a SolutionCache of cache_size entries (0 disables it), so puzzles
+# repeated in the input, even with other letters, are solved once per worker. With
+# cache_file the workers share an SQLite file that also keeps the results between runs.
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from CSP import CSP
+from Puzzle import Puzzle
+from SolutionCache import SolutionCache
+import main
+
+# SolutionCache of the worker process, set by init_cache()
+worker_cache = None
+
+
+# Yields (id, text) for every puzzle of the input
+def read_puzzles(source):
+    if source == '-':
+        yield from read_jsonl(sys.stdin, '<stdin>')
+    elif os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path):
+                yield from read_puzzle_file(path)
+    elif source.endswith('.jsonl'):
+        with open(source, 'r') as file:
+            yield from read_jsonl(file, source)
+    elif any(char in source for char in '*?['):
+        for path in sorted(glob.glob(source)):
+            if os.path.isfile(path):
+                yield from read_puzzle_file(path)
+    else:
+        yield from read_puzzle_file(source)
+
+
+def read_puzzle_file(path):
+    with open(path, 'r') as file:
+        yield path, file.read()
+
+
+# Input line that is not a valid puzzle record: it is sent on like a puzzle, so its
+# error record comes out in input order
+class InvalidInput:
+    def __init__(self, message):
+        self.message = message
+
+
+def read_jsonl(file, name):
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        default_id = name + ':' + str(number)
+        try:
+            item = json.loads(line)
+        except ValueError as error:
+            yield default_id, InvalidInput('Invalid JSON: ' + str(error))
+            continue
+        if not isinstance(item, dict) or not isinstance(item.get('puzzle'), str):
+            yield default_id, InvalidInput("The line must be a JSON object with a 'puzzle' string")
+            continue
+        yield item.get('id', default_id), item['puzzle']
+
+
+def init_cache(cache_size, cache_file):
+    global worker_cache
+    if cache_size > 0 or cache_file is not None:
+        worker_cache = SolutionCache(cache_size, cache_file)
+
+
+# Runs in a worker: solves one puzzle with the cache of the worker. When time_limit
+# or max_nodes is not None, the search stops when the budget runs out (see
+# main.solve_budgeted()) and the result also has the nodes explored and the best
+# partial assignment.
+def solve_one(puzzle_id, text, propagation, time_limit=None, max_nodes=None, base=10):
+    start = time.perf_counter()
+    result = {'id': puzzle_id, 'puzzle': text}
+    try:
+        if isinstance(text, InvalidInput):
+            result['puzzle'] = None
+            raise ValueError(text.message)
+        if not isinstance(text, str):
+            result['puzzle'] = None
+            raise ValueError('The puzzle must be a string')
+        puzzle = Puzzle.parse(text, base)
+        if time_limit is None and max_nodes is None:
+            solved = main.solve_puzzle(puzzle, propagation, cache=worker_cache)
+        else:
+            solved = None if worker_cache is None else worker_cache.get(puzzle)
+            if solved is None:
+                budgeted = main.solve_budgeted(puzzle, propagation, max_nodes, time_limit)
+                result['nodes'] = budgeted['nodes']
+                if budgeted['status'] in ('solved', 'failure'):
+                    solved = 'failure' if budgeted['solution'] is None else budgeted['solution']
+                    if worker_cache is not None:
+                        worker_cache.put(puzzle, solved)
+                else:
+                    result['status'] = budgeted['status']
+                    result['partial'] = budgeted['partial']
+        if 'status' in result:
+            result['solution'] = None
+        elif solved == 'failure':
+            result['status'] = 'failure'
+            result['solution'] = None
+        else:
+            result['status'] = 'solved'
+            result['solution'] = solved
+    except ValueError as error:
+        result['status'] = 'error'
+        result['solution'] = None
+        result['error'] = str(error)
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+# Runs in a worker: solves every puzzle of the chunk and returns its results
+def solve_chunk(chunk, propagation, time_limit=None, max_nodes=None, base=10):
+    return [solve_one(puzzle_id, text, propagation, time_limit, max_nodes, base) for puzzle_id, text in chunk]
+
+
+def chunks(items, chunk_size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Solves every puzzle of the sources and yields the results in input order
+def solve_batch(sources, workers=None, chunk_size=16, propagation='bounds', cache_size=1024, cache_file=None,
+                time_limit=None, max_nodes=None, base=10):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    puzzles = (item for source in sources for item in read_puzzles(source))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_cache,
+                             initargs=(cache_size, cache_file)) as executor:
+        max_in_flight = 4 * workers
+        in_flight = []
+        for chunk in chunks(puzzles, chunk_size):
+            in_flight.append(executor.submit(solve_chunk, chunk, propagation, time_limit, max_nodes, base))
+            if len(in_flight) >= max_in_flight:
+                yield from in_flight.pop(0).result()
+        for future in in_flight:
+            yield from future.result()
+
+
+def write_results(results, output):
+    for result in results:
+        output.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve many cryptarithmetic puzzles in parallel')
+    parser.add_argument('inputs', nargs='+', help='directories, glob patterns, .jsonl files or - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='JSONL output file, - for stdout')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('-c', '--chunk-size', type=int, default=16, help='puzzles sent to a worker at once')
+    parser.add_argument('--propagation', default='bounds', choices=CSP.PROPAGATIONS)
+    parser.add_argument('--cache-size', type=int, default=1024, help='cached results per worker, 0 to disable')
+    parser.add_argument('--cache-file', default=None, help='SQLite file that keeps the results between runs')
+    parser.add_argument('--time-limit', type=float, default=None, help='seconds per puzzle')
+    parser.add_argument('--max-nodes', type=int, default=None, help='nodes per puzzle')
+    parser.add_argument('--base', type=int, default=10, help='base of the numbers of the puzzles')
+    args = parser.parse_args()
+
+    results = solve_batch(args.inputs, args.workers, args.chunk_size, args.propagation,
+                          args.cache_size, args.cache_file, args.time_limit, args.max_nodes, args.base)
+    if args.output == '-':
+        write_results(results, sys.stdout)
+    else:
+        with open(args.output, 'w') as output_file:
+            write_results(results, output_file)
@@ -0,0 +1,262 @@
+# Benchmark of the backtrack search:
+# - runs every puzzle with the trail-based undo of main.backtrack() and with the
+#   previous approach, which copied the whole CSP with copy.deepcopy() before trying
+#   every value, and prints the nodes per second of both.
+# - runs every puzzle with each propagation of the CSP and prints the nodes and time.
+# Usage: python benchmark.py [PUZZLE ...]
+#
+# With --corpus SIZE it runs a corpus generated by corpus.py from --seed through every
+# engine and propagation instead, and writes one JSON record per run (wall time, nodes,
+# consistency checks, peak memory) plus a summary per engine, to catch regressions.
+# Every run stops after --max-nodes nodes or --time-limit seconds and is recorded
+# with the status 'node_limit' or 'time_limit'. As in batch.py, 0 is a budget of 0;
+# --no-limit runs without a budget. The deepcopy engine and the forward
+# propagation are left out unless --engines or --propagations name them.
+# Usage: python benchmark.py --corpus 30 [--seed 0] [--engines ...] [--max-nodes N]
+#        [--time-limit S] [--no-limit] [-o results.json]
+import sys
+import copy
+import json
+import time
+import argparse
+import tracemalloc
+from CSP import CSP
+from Puzzle import Puzzle
+from Search import Search
+from bitmask import values_of
+import corpus
+import main
+import vectorized
+
+ENGINES = ('deepcopy', 'recursive', 'iterative', 'vectorized')
+
+PUZZLES = [
+    'SEND + MORE = MONEY',
+    'CROSS + ROADS = DANGER',
+    'SIX + SEVEN + SEVEN = TWENTY',
+    'FORTY + TEN + TEN = SIXTY',
+    'DONALD + GERALD = ROBERT',
+    'EARTH + AIR + FIRE + WATER = NATURE',
+]
+
+
+class BudgetExceeded(Exception):
+    def __init__(self, status):
+        Exception.__init__(self, status)
+        self.status = status
+
+
+# Counts the nodes of the search, that is, every value that is assigned, and the
+# calls to is_consistent(). When max_nodes or deadline (time.monotonic()) is not None,
+# the search stops with BudgetExceeded('node_limit' or 'time_limit') once it runs out,
+# whatever the engine. The clock is read on the first node and then every 256 nodes.
+class CountingCSP(CSP):
+    nodes = 0
+    checks = 0
+    max_nodes = None
+    deadline = None
+
+    def update_domains(self, var, value, assignment):
+        CountingCSP.nodes += 1
+        if CountingCSP.max_nodes is not None and CountingCSP.nodes > CountingCSP.max_nodes:
+            raise BudgetExceeded('node_limit')
+        if CountingCSP.deadline is not None and CountingCSP.nodes & 255 == 1 \
+                and time.monotonic() >= CountingCSP.deadline:
+            raise BudgetExceeded('time_limit')
+        return CSP.update_domains(self, var, value, assignment)
+
+    def is_consistent(self, id_var, value, assignment):
+        CountingCSP.checks += 1
+        return CSP.is_consistent(self, id_var, value, assignment)
+
+
+# The backtrack algorithm before the trail, kept here as the baseline
+def backtrack_deepcopy(csp, assignment):
+    if csp.assignment_is_complete():
+        return assignment
+
+    var = main.select_unassigned_variable(csp)
+
+    for value in values_of(csp.domains[var.id]):
+        if csp.is_consistent(var.id, value, assignment):
+            assignment[var.letter] = value
+            prev_state = copy.deepcopy(csp)
+            if csp.update_domains(var, value, assignment):
+                csp.set_assigned(var)
+
+                result = backtrack_deepcopy(csp, assignment)
+                if result != 'failure':
+                    return result
+
+            assignment.pop(var.letter)
+            csp.set_unassigned(var)
+            csp = prev_state
+
+    return 'failure'
+
+
+def run(search, text, propagation='forward'):
+    puzzle = Puzzle.parse(text)
+    domains = main.initial_domains(puzzle)
+    CountingCSP.nodes = 0
+    start = time.perf_counter()
+    if domains is not None:
+        csp = CountingCSP(puzzle.variables(), domains, puzzle.columns, propagation)
+        if csp.propagate(csp.letter_positions):
+            search(csp, {})
+    elapsed = time.perf_counter() - start
+    return CountingCSP.nodes, elapsed
+
+
+def run_search(csp, engine):
+    if engine == 'deepcopy':
+        return backtrack_deepcopy(csp, {})
+    if engine == 'recursive':
+        return main.backtrack(csp, {})
+    return Search(csp).run()
+
+
+# Solves the puzzle once with the engine and returns the status, time, nodes and
+# consistency checks. The search stops after max_nodes nodes or time_limit seconds,
+# when they are not None, with the status 'node_limit' or 'time_limit'.
+def run_engine(text, engine, propagation, max_nodes=None, time_limit=None):
+    puzzle = Puzzle.parse(text)
+    CountingCSP.nodes = 0
+    CountingCSP.checks = 0
+    start = time.perf_counter()
+    status = None
+    if engine == 'vectorized':
+        solved = vectorized.solve_vectorized(puzzle)
+        nodes = None
+        checks = None
+    else:
+        solved = 'failure'
+        CountingCSP.max_nodes = max_nodes
+        CountingCSP.deadline = None if time_limit is None else time.monotonic() + time_limit
+        try:
+            csp = main.build_csp(puzzle, propagation, csp_class=CountingCSP)
+            if csp is not None:
+                solved = run_search(csp, engine)
+        except BudgetExceeded as exceeded:
+            status = exceeded.status
+        finally:
+            CountingCSP.max_nodes = None
+            CountingCSP.deadline = None
+        nodes = CountingCSP.nodes
+        checks = CountingCSP.checks
+    elapsed = time.perf_counter() - start
+
+    if status is None:
+        if solved is None:
+            status = 'unavailable'
+        elif solved == 'failure':
+            status = 'failure'
+        else:
+            status = 'solved'
+    return {'status': status, 'time': elapsed, 'nodes': nodes, 'checks': checks}
+
+
+# Peak memory allocated while solving, measured in a separate run because tracemalloc
+# slows down the solve
+def peak_memory(text, engine, propagation, max_nodes=None, time_limit=None):
+    tracemalloc.start()
+    try:
+        run_engine(text, engine, propagation, max_nodes, time_limit)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# Runs every puzzle with every engine and propagation, each run with the budget of
+# max_nodes nodes and time_limit seconds. A run that ran out of its budget is not
+# measured again for the peak memory, and is counted apart in the summary.
+def benchmark_corpus(items, engines, propagations, max_nodes=None, time_limit=None):
+    sys.setrecursionlimit(10000)
+    records = []
+    for item in items:
+        for engine in engines:
+            for propagation in (propagations if engine != 'vectorized' else [None]):
+                record = dict(item)
+                record['engine'] = engine
+                record['propagation'] = propagation
+                record.update(run_engine(item['puzzle'], engine, propagation or 'bounds', max_nodes, time_limit))
+                expected = 'failure' if item['solutions'] == 0 else 'solved'
+                if record['status'] in ('node_limit', 'time_limit'):
+                    record['peak_memory'] = None
+                    record['correct'] = None
+                else:
+                    record['peak_memory'] = peak_memory(item['puzzle'], engine, propagation or 'bounds',
+                                                        max_nodes, time_limit)
+                    record['correct'] = record['status'] in (expected, 'unavailable')
+                records.append(record)
+
+    summary = {}
+    for record in records:
+        key = record['engine'] if record['propagation'] is None else record['engine'] + '/' + record['propagation']
+        totals = summary.setdefault(key, {'puzzles': 0, 'time': 0.0, 'nodes': 0, 'checks': 0,
+                                          'peak_memory': 0, 'incorrect': 0, 'over_budget': 0})
+        totals['puzzles'] += 1
+        totals['time'] += record['time']
+        totals['nodes'] += record['nodes'] or 0
+        totals['checks'] += record['checks'] or 0
+        totals['peak_memory'] = max(totals['peak_memory'], record['peak_memory'] or 0)
+        if record['correct'] is None:
+            totals['over_budget'] += 1
+        elif not record['correct']:
+            totals['incorrect'] += 1
+    return {'records': records, 'summary': summary}
+
+
+def main_benchmark(puzzles):
+    sys.setrecursionlimit(10000)
+    print('%-32s %10s %12s %12s %8s' % ('puzzle', 'nodes', 'deepcopy/s', 'trail/s', 'speedup'))
+    for text in puzzles:
+        nodes, before = run(backtrack_deepcopy, text)
+        _, after = run(main.backtrack, text)
+        name = text if len(text) <= 32 else text[:29] + '...'
+        print('%-32s %10d %12.0f %12.0f %7.1fx' % (name, nodes, nodes / before, nodes / after, before / after))
+
+    print()
+    header = '%-32s' % 'puzzle'
+    for propagation in CSP.PROPAGATIONS:
+        header += ' %10s %8s' % (propagation, 'time')
+    print(header)
+    for text in puzzles:
+        line = '%-32s' % (text if len(text) <= 32 else text[:29] + '...')
+        for propagation in CSP.PROPAGATIONS:
+            nodes, elapsed = run(main.backtrack, text, propagation)
+            line += ' %10d %8.3f' % (nodes, elapsed)
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the cryptarithmetic solvers')
+    parser.add_argument('puzzles', nargs='*', help='puzzles for the comparison tables')
+    parser.add_argument('--corpus', type=int, default=None, help='size of the generated corpus')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated corpus')
+    parser.add_argument('--max-addends', type=int, default=4)
+    parser.add_argument('--max-length', type=int, default=6)
+    # The deepcopy baseline and the forward propagation take minutes on some corpus
+    # puzzles, so they only run when asked for
+    parser.add_argument('--engines', nargs='+', default=['recursive', 'iterative', 'vectorized'], choices=ENGINES)
+    parser.add_argument('--propagations', nargs='+', default=['bounds', 'hall', 'table'], choices=CSP.PROPAGATIONS)
+    parser.add_argument('--max-nodes', type=int, default=100000, help='nodes per corpus run')
+    parser.add_argument('--time-limit', type=float, default=10.0, help='seconds per corpus run')
+    parser.add_argument('--no-limit', action='store_true', help='run the corpus without --max-nodes and --time-limit')
+    parser.add_argument('-o', '--output', default='-', help='JSON output file, - for stdout')
+    args = parser.parse_args()
+
+    if args.corpus is None:
+        main_benchmark(args.puzzles or PUZZLES)
+    else:
+        items = corpus.generate_corpus(args.seed, args.corpus, args.max_addends, max_length=args.max_length)
+        if args.no_limit:
+            args.max_nodes = args.time_limit = None
+        results = benchmark_corpus(items, args.engines, args.propagations, args.max_nodes, args.time_limit)
+        results['seed'] = args.seed
+        if args.output == '-':
+            json.dump(results, sys.stdout, indent=1)
+            print()
+        else:
+            with open(args.output, 'w') as output_file:
+                json.dump(results, output_file, indent=1)
@@ -0,0 +1,39 @@
+# Helpers for domains stored as int bitmasks: bit v is set when the value v is
+# still in the domain. A digit domain in base 10 fits in 10 bits and a carry
+# domain in 2 bits, so a domain is a single small int that is copied for free.
+
+
+def mask_of(values):
+    mask = 0
+    for value in values:
+        mask |= 1 << value
+    return mask
+
+
+# Values of the domain from the lowest to the highest, removing the lowest set
+# bit of the mask at every step
+def values_of(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def lowest_value(mask):
+    return (mask & -mask).bit_length() - 1
+
+
+# Mask with the values low ... high, empty when high < low
+def range_mask(low, high):
+    if low < 0:
+        low = 0
+    if high < low:
+        return 0
+    return ((1 << (high + 1)) - 1) >> low << low
+
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(mask):
+        return bin(mask).count('1')
@@ -0,0 +1,94 @@
+# Deterministic generator of puzzles for benchmarks. With the same seed and arguments
+# it always returns the same corpus. Every puzzle is a dict with:
+# - puzzle: the puzzle as 'WORD + WORD = WORD'
+# - addends: number of addends
+# - length: number of letters of the longest addend
+# - kind: 'unique' (exactly one solution), 'many' (more than one) or 'unsolvable'
+# - solutions: number of solutions, counted up to max_count
+#
+# A solvable puzzle is made by giving the ten digits to ten random letters, writing
+# random numbers with those letters and their sum as the result. An unsolvable puzzle
+# is a solvable one where a letter of the result is changed until no solution is left.
+import random
+import string
+from Puzzle import Puzzle
+import main
+
+KINDS = ('unique', 'many', 'unsolvable')
+
+
+def random_word(rng, digit_letters, length):
+    digits = [rng.randint(1, 9)] + [rng.randint(0, 9) for _ in range(length - 1)]
+    return ''.join(digit_letters[d] for d in digits)
+
+
+def write_number(number, digit_letters):
+    return ''.join(digit_letters[int(d)] for d in str(number))
+
+
+def value_of(word, letter_digits):
+    return int(''.join(str(letter_digits[char]) for char in word))
+
+
+def make_solvable(rng, addends, min_length, max_length):
+    letters = rng.sample(string.ascii_uppercase, 10)
+    digit_letters = dict(enumerate(letters))
+    letter_digits = {letter: digit for digit, letter in digit_letters.items()}
+    words = [random_word(rng, digit_letters, rng.randint(min_length, max_length)) for _ in range(addends)]
+    total = sum(value_of(word, letter_digits) for word in words)
+    return words, write_number(total, digit_letters)
+
+
+def make_unsolvable(rng, addends, min_length, max_length, attempts=20):
+    words, result = make_solvable(rng, addends, min_length, max_length)
+    letters = sorted(set(''.join(words) + result))
+    for _ in range(attempts):
+        position = rng.randrange(len(result))
+        changed = result[:position] + rng.choice(letters) + result[position + 1:]
+        puzzle = Puzzle(words, changed)
+        if main.count_solutions(puzzle, 1) == 0:
+            return words, changed
+    return None
+
+
+# Returns size puzzles, about the same number of every kind, with 2 ... max_addends
+# addends and words of min_length ... max_length letters
+def generate_corpus(seed=0, size=30, max_addends=4, min_length=2, max_length=6, max_count=100):
+    rng = random.Random(seed)
+    quota = {kind: size // len(KINDS) + (1 if k < size % len(KINDS) else 0) for k, kind in enumerate(KINDS)}
+    corpus = []
+    attempts = 0
+    while any(quota.values()) and attempts < 100 * size:
+        attempts += 1
+        addends = rng.randint(2, max_addends)
+        if quota['unsolvable'] and rng.random() < 1 / 3:
+            made = make_unsolvable(rng, addends, min_length, max_length)
+            if made is None:
+                continue
+            words, result = made
+            solutions = 0
+        else:
+            words, result = make_solvable(rng, addends, min_length, max_length)
+            solutions = main.count_solutions(Puzzle(words, result), max_count)
+        if solutions == 0:
+            kind = 'unsolvable'
+        elif solutions == 1:
+            kind = 'unique'
+        else:
+            kind = 'many'
+        if quota[kind] == 0:
+            continue
+        quota[kind] -= 1
+        corpus.append({
+            'puzzle': ' + '.join(words) + ' = ' + result,
+            'addends': addends,
+            'length': max(len(word) for word in words),
+            'kind': kind,
+            'solutions': solutions,
+        })
+    return corpus
+
+
+if __name__ == '__main__':
+    for item in generate_corpus():
+        print(item['kind'], item['solutions'], item['puzzle'])
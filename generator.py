@@ -0,0 +1,154 @@
+# Generator of new puzzles from a word list: tries combinations of words as addends
+# (or factors) and result, and writes out the ones with exactly one solution.
+# Usage: python generator.py WORDLIST [-o OUTPUT] [-n ADDENDS] [--operator OP] [--base B]
+#        [-w WORKERS] [-c CHUNK_SIZE] [--limit N] [--propagation P]
+#
+# WORDLIST has one word per line ('-' for stdin); the words are upper-cased and the
+# lines that are not a single word are skipped. Every accepted puzzle is written as
+# soon as it is found, one per line as 'WORD + WORD = WORD', so the output can be
+# given to stream.py.
+#
+# The candidates are streamed by candidates(): every combination of n_addends
+# different words, followed by every other word that can be their result. The cheap
+# structural filters run in the parent before a candidate is sent to a worker:
+# - the result must have a length that the sum (or product) can have, see
+#   result_lengths(), so only the words of those lengths are tried as result
+# - the puzzle must have at most base different letters
+# The workers then keep the candidates with exactly one solution, with a search that
+# stops at the second solution (main.has_unique_solution()). Candidates are sent in
+# chunks of chunk_size, with at most a few chunks per worker in flight, like batch.py.
+# The default propagation is 'table': it is as fast as 'bounds' on sums, and prunes
+# the columns with products of a multiplication much better.
+import os
+import sys
+import argparse
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+from CSP import CSP
+from Puzzle import Puzzle
+import batch
+import main
+
+OPERATORS = ('+', '*')
+
+
+# Returns the words of the file, upper-cased and without repetitions
+def read_words(file, base=10):
+    words = []
+    seen = set()
+    for line in file:
+        word = line.strip().upper()
+        if word.isalpha() and word.isascii() and word not in seen and len(set(word)) <= base:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+# Number of digits of the number in the base
+def num_digits(number, base):
+    digits = 1
+    while number >= base:
+        number //= base
+        digits += 1
+    return digits
+
+
+# The lengths the result can have, given the lengths of the addends (or factors)
+def result_lengths(lengths, base=10, operator='+'):
+    if operator == '*':
+        return range(sum(lengths) - 1, sum(lengths) + 1)
+    # The biggest sum is every addend written with its biggest digits
+    longest = max(lengths)
+    biggest = sum(base ** length - 1 for length in lengths)
+    return range(longest, num_digits(biggest, base) + 1)
+
+
+# Yields the text of every candidate puzzle that passes the structural filters
+def candidates(words, n_addends=2, base=10, operator='+'):
+    by_length = {}
+    for word in words:
+        by_length.setdefault(len(word), []).append(word)
+    letters = {word: set(word) for word in words}
+
+    for addends in combinations(words, n_addends):
+        addend_letters = set().union(*(letters[word] for word in addends))
+        if len(addend_letters) > base:
+            continue
+        for length in result_lengths([len(word) for word in addends], base, operator):
+            for result in by_length.get(length, ()):
+                if result in addends or len(addend_letters | letters[result]) > base:
+                    continue
+                yield (' ' + operator + ' ').join(addends) + ' = ' + result
+
+
+# Runs in a worker: returns the candidates of the chunk that have exactly one solution
+def check_chunk(chunk, base, propagation):
+    return [text for text in chunk if main.has_unique_solution(Puzzle.parse(text, base), propagation)]
+
+
+# Yields every candidate with exactly one solution, in the order of the candidates,
+# and stops after limit of them when limit is not None
+def generate(words, n_addends=2, base=10, operator='+', workers=None, chunk_size=16, propagation='table',
+             limit=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers)
+    count = 0
+    try:
+        max_in_flight = 4 * workers
+        in_flight = []
+        chunk_list = batch.chunks(candidates(words, n_addends, base, operator), chunk_size)
+        while limit is None or count < limit:
+            chunk = next(chunk_list, None)
+            if chunk is not None:
+                in_flight.append(executor.submit(check_chunk, chunk, base, propagation))
+                if len(in_flight) < max_in_flight:
+                    continue
+            elif not in_flight:
+                break
+            for text in in_flight.pop(0).result():
+                if limit is not None and count >= limit:
+                    break
+                yield text
+                count += 1
+    finally:
+        # The chunks that have not started when the limit is reached are dropped
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def write_puzzles(puzzles, output):
+    count = 0
+    for text in puzzles:
+        output.write(text + '\n')
+        output.flush()
+        count += 1
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate puzzles with exactly one solution from a word list')
+    parser.add_argument('wordlist', help='file with one word per line, - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='output file, - for stdout')
+    parser.add_argument('-n', '--addends', type=int, default=2, help='number of addends')
+    parser.add_argument('--operator', default='+', choices=OPERATORS)
+    parser.add_argument('--base', type=int, default=10, help='base of the numbers of the puzzles')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('-c', '--chunk-size', type=int, default=16, help='candidates sent to a worker at once')
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many puzzles')
+    parser.add_argument('--propagation', default='table', choices=CSP.PROPAGATIONS)
+    args = parser.parse_args()
+    if args.operator == '*' and args.addends != 2:
+        parser.error('a multiplication needs exactly two factors')
+
+    if args.wordlist == '-':
+        words = read_words(sys.stdin, args.base)
+    else:
+        with open(args.wordlist, 'r') as word_file:
+            words = read_words(word_file, args.base)
+    puzzles = generate(words, args.addends, args.base, args.operator, args.workers, args.chunk_size,
+                       args.propagation, args.limit)
+    if args.output == '-':
+        write_puzzles(puzzles, sys.stdout)
+    else:
+        with open(args.output, 'w') as output_file:
+            write_puzzles(puzzles, output_file)
@@ -1,131 +1,351 @@
 # Backtrack algorithm to solve the cryptarithmetic problem
 # Samuel Vieira Restrepo
 # sv2657@nyu.edu
-import os
-import copy
-import queue
+import time
 from CSP import CSP
-from Variable import Variable
+from bitmask import values_of
+from Puzzle import Puzzle
+from presolve import presolve
+import vectorized
 
 
-# For the Minimum Remaining Value I use a Priority Queue with MRV as
-# the priority. If there is more than 1 item with the same MRV I use
-# the get_degree() function to determine the degree heuristic.
+# For the Minimum Remaining Value the CSP keeps the unassigned variables in
+# buckets by domain size (see VariableOrder), so the variables with the MRV are
+# the smallest non-empty bucket. If there is more than 1 variable with the MRV
+# I use the get_degree() function to determine the degree heuristic, and the
+# lowest id if they also have the same degree. A CSP with a Strategy uses the
+# variable order of the strategy instead.
 def select_unassigned_variable(csp):
-    min_queue = queue.PriorityQueue()
-    for i in range(len(csp.variables)):
-        if not csp.variables[i].is_assigned:
-            priority_item = (len(csp.domains[i]), csp.variables[i])
-            min_queue.put(priority_item)
-
-    vars_with_m_r_v = []
-    m_r_v = float('inf')
-    queue_item = min_queue.get()
-    vars_with_m_r_v.append(queue_item[1])
-
-    while queue_item[0] <= m_r_v and min_queue.qsize() > 0:
-        vars_with_m_r_v.append(queue_item[1])
-        m_r_v = queue_item[0]
-        queue_item = min_queue.get()
+    if csp.strategy is not None:
+        return csp.strategy.select(csp)
+    vars_with_m_r_v = csp.order.smallest()
 
     # If there is only one variable with the MRV, return that, otherwise
     # get the degree heuristic for every var and use that.
     if len(vars_with_m_r_v) == 1:
-        return vars_with_m_r_v[0]
-    else:
-        max_degree = 0
-        max_var = None
         for i in vars_with_m_r_v:
-            curr_degree = csp.get_degree(i.id)
-            if curr_degree > max_degree:
-                max_degree = curr_degree
-                max_var = i
-    return max_var
+            return csp.variables[i]
+
+    max_degree = -1
+    max_id = -1
+    for i in vars_with_m_r_v:
+        curr_degree = csp.get_degree(i)
+        if curr_degree > max_degree or (curr_degree == max_degree and i < max_id):
+            max_degree = curr_degree
+            max_id = i
+    return csp.variables[max_id]
+
 
+# Values of the variable in the order the search tries them: from the lowest to the
+# highest, or in the value order of the Strategy of the CSP
+def ordered_values(csp, var, assignment):
+    if csp.strategy is None:
+        return values_of(csp.domains[var.id])
+    return csp.strategy.values(csp, var, assignment)
 
-# This is the main Backtrack algorithm with some modifications
+
+# This is the main Backtrack algorithm with some modifications. Instead of copying
+# the CSP before every value, the domain removals made by update_domains() are
+# recorded in the trail of the CSP and undone when the value fails. A value is
+# not explored when its propagation empties a domain. When the CSP has a
+# NogoodStore, a node whose subproblem already failed somewhere else is not
+# explored, and a node that fails is added to the store.
 def backtrack(csp, assignment):
     if csp.assignment_is_complete():
+        if csp.stats is not None:
+            csp.stats.solution(assignment)
         return assignment
 
-    var = select_unassigned_variable(csp)
+    nogoods = csp.nogoods
+    if nogoods is not None:
+        key = nogoods.key(csp)
+        if nogoods.failed(key):
+            return 'failure'
+
+    stats = csp.stats
+    if stats is None:
+        var = select_unassigned_variable(csp)
+    else:
+        var = stats.select(select_unassigned_variable, csp)
 
-    for value in csp.domains[var.id]:
+    for value in ordered_values(csp, var, assignment):
         if csp.is_consistent(var.id, value, assignment):
             assignment[var.letter] = value
-            prev_state = copy.deepcopy(csp)
-            csp.update_domains(var, value, assignment)
-            csp.set_assigned(var)
+            mark = csp.trail_mark()
+            if stats is not None:
+                stats.node(len(assignment), var, value)
+            if csp.update_domains(var, value, assignment):
+                csp.set_assigned(var)
 
-            result = backtrack(csp, assignment)
-            if result != 'failure':
-                return result
+                result = backtrack(csp, assignment)
+                if result != 'failure':
+                    return result
 
+                csp.set_unassigned(var)
+                if stats is not None:
+                    stats.backtrack(len(assignment), var, value)
+            elif stats is not None:
+                stats.wipeout(len(assignment), var, value)
             assignment.pop(var.letter)
-            csp.set_unassigned(var)
-            csp = prev_state
+            csp.undo(mark)
 
+    if nogoods is not None:
+        nogoods.add(key)
     return 'failure'
 
 
-# In this function I prepare the CSP with the appropriate variables and domains
-# from the input file.
-def solve_cryptarithmetic(filename):
-    variables = []
-    # Populate variables array with x0 ... x12
-    file = open(filename, 'r')
-    iden = 0
-    for char in file.read():
-        if char != '\n':
-            new_var = Variable(letter=char, iden=iden)
-            variables.append(new_var)
-            iden += 1
-
-    # Append auxiliary variables c0 ... c3 to variables
-    variables.append(Variable(letter='c0', iden=13))
-    variables.append(Variable(letter='c1', iden=14))
-    variables.append(Variable(letter='c2', iden=15))
-    variables.append(Variable(letter='c3', iden=16))
-
-    domains = []
-    for i in range(len(variables)):
-        if i > 12:
-            domains.append({0, 1})
-        elif i == 8:
-            domains.append({1})
-        elif i == 0 or i == 4:
-            domains.append({1, 2, 3, 4, 5, 6, 7, 8, 9})
-        else:
-            domains.append({0, 1, 2, 3, 4, 5, 6, 7, 8, 9})
+# Generator version of backtrack(): yields every complete assignment as soon as it
+# is found. The same assignment dict is yielded every time and is changed when the
+# search continues, so callers that keep a solution must copy it.
+def backtrack_all(csp, assignment):
+    if csp.assignment_is_complete():
+        if csp.stats is not None:
+            csp.stats.solution(assignment)
+        yield assignment
+        return
 
-    csp = CSP(variables, domains, [])
+    nogoods = csp.nogoods
+    if nogoods is not None:
+        key = nogoods.key(csp)
+        if nogoods.failed(key):
+            return
+    found = False
+
+    stats = csp.stats
+    if stats is None:
+        var = select_unassigned_variable(csp)
+    else:
+        var = stats.select(select_unassigned_variable, csp)
+
+    for value in ordered_values(csp, var, assignment):
+        if csp.is_consistent(var.id, value, assignment):
+            assignment[var.letter] = value
+            mark = csp.trail_mark()
+            if stats is not None:
+                stats.node(len(assignment), var, value)
+            if csp.update_domains(var, value, assignment):
+                csp.set_assigned(var)
+                for solution in backtrack_all(csp, assignment):
+                    found = True
+                    yield solution
+                csp.set_unassigned(var)
+                if stats is not None:
+                    stats.backtrack(len(assignment), var, value)
+            elif stats is not None:
+                stats.wipeout(len(assignment), var, value)
+            assignment.pop(var.letter)
+            csp.undo(mark)
+
+    if nogoods is not None and not found:
+        nogoods.add(key)
+
+
+# Counting version of backtrack(): returns the number of solutions, stopping once it
+# reaches limit, without building any solution
+def count_backtrack(csp, assignment, limit=None):
+    if csp.assignment_is_complete():
+        if csp.stats is not None:
+            csp.stats.solution(assignment)
+        return 1
+
+    nogoods = csp.nogoods
+    if nogoods is not None:
+        key = nogoods.key(csp)
+        if nogoods.failed(key):
+            return 0
+
+    stats = csp.stats
+    if stats is None:
+        var = select_unassigned_variable(csp)
+    else:
+        var = stats.select(select_unassigned_variable, csp)
+
+    count = 0
+    for value in ordered_values(csp, var, assignment):
+        if csp.is_consistent(var.id, value, assignment):
+            assignment[var.letter] = value
+            mark = csp.trail_mark()
+            if stats is not None:
+                stats.node(len(assignment), var, value)
+            if csp.update_domains(var, value, assignment):
+                csp.set_assigned(var)
+                count += count_backtrack(csp, assignment, None if limit is None else limit - count)
+                csp.set_unassigned(var)
+                if stats is not None:
+                    stats.backtrack(len(assignment), var, value)
+            elif stats is not None:
+                stats.wipeout(len(assignment), var, value)
+            assignment.pop(var.letter)
+            csp.undo(mark)
+            if limit is not None and count >= limit:
+                break
+
+    if nogoods is not None and count == 0:
+        nogoods.add(key)
+    return count
+
+
+# Domains of the puzzle after the structural rules of presolve.py, or None when they
+# prove that the puzzle has no solution
+def initial_domains(puzzle):
+    report = presolve(puzzle, propagate=False)
+    if report['status'] == 'unsat':
+        return None
+    return report['domains']
 
-    # We call the Backtrack algorithm and store the solution
-    solved = backtrack(csp, {})
-    if solved != 'failure':
-        word1, word2, word3 = '', '', ''
-        for i in range(4):
-            word1 = word1 + str(solved[csp.variables[i].letter])
 
-        for i in range(4, 8):
-            word2 = word2 + str(solved[csp.variables[i].letter])
+# Builds the CSP of a Puzzle from initial_domains(), attaches the hooks that are not
+# None (a Stats, a NogoodStore and a Strategy) and propagates the domains of the
+# letters. csp_class is CSP or a subclass of it (see parallel.CancellableCSP).
+# Returns the CSP, or None when the puzzle has no solution.
+def build_csp(puzzle, propagation='bounds', stats=None, nogoods=None, strategy=None, csp_class=CSP):
+    domains = initial_domains(puzzle)
+    if domains is None:
+        return None
+    csp = csp_class(puzzle.variables(), domains, puzzle.columns, propagation)
+    if stats is not None:
+        stats.attach(csp)
+    if nogoods is not None:
+        nogoods.attach(csp)
+    if strategy is not None:
+        strategy.attach(csp)
+    if not csp.propagate(csp.letter_positions):
+        return None
+    return csp
 
-        for i in range(8, 13):
-            word3 = word3 + str(solved[csp.variables[i].letter])
 
-        if os.path.exists('result.txt'):
-            os.remove('result.txt')
-        result_file = open('result.txt', 'x')
-        result_file.write(word1 + '\n')
-        result_file.write(word2 + '\n')
-        result_file.write(word3 + '\n')
+# Builds the CSP of a Puzzle, propagates the initial domains and calls the
+# Backtrack algorithm. Returns the value of every letter, without the carries,
+# or 'failure'. The propagation argument selects the propagation of the CSP:
+# 'forward', 'bounds', 'hall' or 'table'. The engine argument selects backtrack()
+# ('recursive'), Search ('iterative'), which has no limit on the depth, or the
+# NumPy column solver of vectorized.py ('vectorized'), which falls back to
+# Search when NumPy is missing or its frontier gets too big. When stats is a
+# Stats, it collects the statistics of the search (not for 'vectorized'). When
+# cache is a SolutionCache, a cached result is returned without searching and a
+# new result is added to the cache. When nogoods is a NogoodStore, the search
+# records the subproblems that failed and does not explore them again. When
+# strategy is a Strategy, the search uses its variable and value orders, and its
+# restarts with the 'iterative' engine (the 'recursive' one cannot stop and resume).
+def solve_puzzle(puzzle, propagation='bounds', engine='iterative', stats=None, cache=None, nogoods=None,
+                 strategy=None):
+    if cache is not None:
+        solved = cache.get(puzzle)
+        if solved is None:
+            solved = solve_puzzle(puzzle, propagation, engine, stats, None, nogoods, strategy)
+            cache.put(puzzle, solved)
+        return solved
 
+    if engine == 'vectorized':
+        solved = vectorized.solve_vectorized(puzzle)
+        if solved is not None:
+            return solved
+        engine = 'iterative'
+
+    csp = build_csp(puzzle, propagation, stats, nogoods, strategy)
+    if csp is None:
+        return 'failure'
+
+    if engine == 'iterative':
+        # Search imports this module, so it is imported here
+        from Search import Search
+        solved = Search(csp).solve()
+    elif engine == 'recursive':
+        solved = backtrack(csp, {})
     else:
-        if os.path.exists('result.txt'):
-            os.remove('result.txt')
-        result_file = open('result.txt', 'x')
-        result_file.write('failure')
-    return
+        raise ValueError('Unknown engine: ' + repr(engine))
+    if solved == 'failure':
+        return solved
+    return {letter: solved[letter] for letter in puzzle.distinct_letters}
+
+
+# solve_puzzle() with Search and a budget: the search stops after max_nodes nodes or
+# time_limit seconds, when they are not None. Returns a dict with:
+# - status: 'solved', 'failure', 'node_limit' or 'time_limit'
+# - solution: the value of every letter, or None when the status is not 'solved'
+# - partial: the value of the letters in the deepest assignment the search reached,
+#   the best partial assignment when the budget ran out
+# - nodes: values assigned (Search.nodes, the same count as Stats.nodes)
+# - time: seconds spent
+# - restarts: restarts made by the strategy, when strategy is not None
+def solve_budgeted(puzzle, propagation='bounds', max_nodes=None, time_limit=None, stats=None, nogoods=None,
+                   strategy=None):
+    from Search import Search
+    start = time.perf_counter()
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    result = {'status': 'failure', 'solution': None, 'partial': {}, 'nodes': 0}
+    if strategy is not None:
+        result['restarts'] = 0
+
+    csp = build_csp(puzzle, propagation, stats, nogoods, strategy)
+    if csp is not None:
+        search = Search(csp)
+        solved = search.solve(max_nodes, deadline)
+        if solved == 'paused':
+            result['status'] = 'node_limit'
+        elif solved == 'timeout':
+            result['status'] = 'time_limit'
+        elif solved != 'failure':
+            result['status'] = 'solved'
+            result['solution'] = {letter: solved[letter] for letter in puzzle.distinct_letters}
+        result['partial'] = {letter: search.best[letter] for letter in puzzle.distinct_letters
+                             if letter in search.best}
+        result['nodes'] = search.nodes
+        if strategy is not None:
+            result['restarts'] = strategy.num_restarts
+    result['time'] = time.perf_counter() - start
+    return result
+
+
+# Yields the value of every letter for each solution of the Puzzle, one at a time,
+# stopping after limit solutions, with the Stats, NogoodStore and Strategy of
+# solve_puzzle() when they are not None
+def solve_all(puzzle, limit=None, propagation='bounds', stats=None, nogoods=None, strategy=None):
+    if limit is not None and limit <= 0:
+        return
+    csp = build_csp(puzzle, propagation, stats, nogoods, strategy)
+    if csp is None:
+        return
+
+    found = 0
+    for solved in backtrack_all(csp, {}):
+        yield {letter: solved[letter] for letter in puzzle.distinct_letters}
+        found += 1
+        if found == limit:
+            return
+
+
+# Number of solutions of the Puzzle, counting up to limit, with the NogoodStore
+# nogoods, the orders of the Strategy strategy and the Stats stats if they are not None
+def count_solutions(puzzle, limit=None, propagation='bounds', nogoods=None, strategy=None, stats=None):
+    if limit is not None and limit <= 0:
+        return 0
+    csp = build_csp(puzzle, propagation, stats, nogoods, strategy)
+    if csp is None:
+        return 0
+    return count_backtrack(csp, {}, limit)
+
+
+# A puzzle is unique when the search stops at the second solution without finding it
+def has_unique_solution(puzzle, propagation='bounds'):
+    return count_solutions(puzzle, 2, propagation) == 1
+
+
+# In this function I prepare the puzzle from the input file. The Puzzle class
+# compiles the words into the column constraints, so any number of addends and
+# any word lengths are supported.
+def solve_cryptarithmetic(filename, propagation='bounds', engine='iterative', stats=None, cache=None):
+    puzzle = Puzzle.from_file(filename)
+
+    # We call the Backtrack algorithm and store the solution
+    solved = solve_puzzle(puzzle, propagation, engine, stats, cache)
+    with open('result.txt', 'w') as result_file:
+        if solved != 'failure':
+            for line in puzzle.format_solution(solved):
+                result_file.write(line + '\n')
+        else:
+            result_file.write('failure')
+    return solved
 
 
 if __name__ == '__main__':
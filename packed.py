@@ -0,0 +1,93 @@
+# Compact binary encoding of a node of the search: the domain of every variable
+# (letter positions and hidden variables, in the order of CSP.variables) and which of
+# them are assigned. The value of an assigned variable is the only value left in its
+# domain, so the domains and the assigned flags are the whole state of the node.
+#
+# The layout has a fixed width for every puzzle:
+# - a header of HEADER_SIZE bytes: the number of variables (4 bytes) and the bytes
+#   of every domain (1 byte), then padding, so the domains are aligned
+# - one unsigned int of itemsize bytes per variable with its domain bitmask
+# - the assigned flags, one bit per variable
+# Numbers are written in the byte order of the machine, since the states are made
+# to move between the processes of a solve or to be read back by the same machine.
+#
+# view() returns memoryviews of the domains and the flags without copying the
+# buffer, so a state can be read from a bytes object, a bytearray or shared memory,
+# and pack_into() writes a state into any writable buffer. restore() puts a CSP in the
+# state of the buffer, so the search resumes from the node (see Search.from_packed()).
+import struct
+from array import array
+
+HEADER = struct.Struct('=IB3x')
+HEADER_SIZE = HEADER.size
+
+
+# Bytes needed by the domains of the puzzle: the digits of the base, or more for a
+# carry that can be bigger than a digit (sums of many addends)
+def domain_itemsize(puzzle):
+    bits = max([puzzle.base] + [bound + 1 for bound in puzzle.carry_bounds])
+    for code in ('B', 'H', 'I', 'Q'):
+        if array(code).itemsize * 8 >= bits:
+            return array(code).itemsize
+    raise ValueError('The domains of the puzzle are too big to be packed')
+
+
+def packed_size(num_variables, itemsize):
+    return HEADER_SIZE + num_variables * itemsize + (num_variables + 7) // 8
+
+
+def typecode(itemsize):
+    for code in ('B', 'H', 'I', 'Q'):
+        if array(code).itemsize == itemsize:
+            return code
+    raise ValueError('Invalid size of the packed domains: ' + str(itemsize))
+
+
+# Writes the state of the CSP into the buffer at offset, and returns the number of
+# bytes written
+def pack_into(csp, buffer, itemsize, offset=0):
+    num_variables = len(csp.variables)
+    size = packed_size(num_variables, itemsize)
+    memory = memoryview(buffer)[offset:offset + size]
+    if len(memory) < size:
+        raise ValueError('The buffer is too small for the state')
+    HEADER.pack_into(memory, 0, num_variables, itemsize)
+    end = HEADER_SIZE + num_variables * itemsize
+    memory[HEADER_SIZE:end].cast(typecode(itemsize))[:] = array(typecode(itemsize), csp.domains)
+    flags = bytearray((num_variables + 7) // 8)
+    for x in csp.variables:
+        if x.is_assigned:
+            flags[x.id >> 3] |= 1 << (x.id & 7)
+    memory[end:size] = flags
+    return size
+
+
+def pack(csp, itemsize):
+    buffer = bytearray(packed_size(len(csp.variables), itemsize))
+    pack_into(csp, buffer, itemsize)
+    return bytes(buffer)
+
+
+# Returns (domains, flags) as memoryviews of the buffer: domains[i] is the domain of
+# the variable i, and bit i % 8 of flags[i // 8] is set when it is assigned
+def view(buffer, offset=0):
+    memory = memoryview(buffer)[offset:]
+    num_variables, itemsize = HEADER.unpack_from(memory, 0)
+    end = HEADER_SIZE + num_variables * itemsize
+    if len(memory) < packed_size(num_variables, itemsize):
+        raise ValueError('The buffer is too small for the state')
+    domains = memory[HEADER_SIZE:end].cast(typecode(itemsize))
+    return domains, memory[end:end + (num_variables + 7) // 8]
+
+
+def is_assigned(flags, id_var):
+    return flags[id_var >> 3] >> (id_var & 7) & 1 == 1
+
+
+# Puts the CSP, which must be a CSP of the same puzzle, in the state of the buffer,
+# and returns the assignment of that state
+def restore(csp, buffer, offset=0):
+    domains, flags = view(buffer, offset)
+    if len(domains) != len(csp.variables):
+        raise ValueError('The state does not belong to this puzzle')
+    return csp.restore(domains.tolist(), [is_assigned(flags, x.id) for x in csp.variables])
@@ -0,0 +1,174 @@
+# Parallel search for a single puzzle. The search tree is split into subproblems, every
+# subproblem being a node of the tree packed with packed.py (the domains and the
+# assigned variables of the node), so it is sent to a worker as a few bytes. The
+# subproblems are solved by a pool of processes:
+# - The parent expands the first decisions of the variable ordering of backtrack()
+#   until there are enough subproblems for every worker.
+# - A worker restores the node of its subproblem on a new CSP, without replaying the
+#   decisions that lead to it. If the subtree left is still big (the estimated search
+#   space is more than 2 ** split_bits), it is split again and the children are sent
+#   back to the parent, so no worker is stuck with a huge subtree while the others are
+#   idle. Otherwise the worker solves it.
+# - The first worker that finds a solution sets a shared event: the other workers stop
+#   their search and the subproblems that did not start are cancelled.
+# Usage: python parallel.py PUZZLE [-w WORKERS] [--base B]
+import os
+import math
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from CSP import CSP
+from Puzzle import Puzzle
+from bitmask import values_of
+import main
+import packed
+
+
+class Cancelled(Exception):
+    pass
+
+
+# CSP that stops the search of a worker once another worker found a solution. The
+# event is only checked every 256 nodes, and never in the parent, which has no event.
+class CancellableCSP(CSP):
+    stop_event = None
+    calls = 0
+
+    def update_domains(self, var, value, assignment):
+        CancellableCSP.calls += 1
+        if CancellableCSP.calls & 255 == 0 and CancellableCSP.stop_event is not None \
+                and CancellableCSP.stop_event.is_set():
+            raise Cancelled()
+        return CSP.update_domains(self, var, value, assignment)
+
+
+def init_worker(stop_event):
+    CancellableCSP.stop_event = stop_event
+
+
+def create_csp(text, propagation, base=10):
+    puzzle = Puzzle.parse(text, base)
+    return puzzle, main.build_csp(puzzle, propagation, csp_class=CancellableCSP)
+
+
+# Returns the packed children of the node: one for every value of the next variable
+# that survives the propagation
+def expand(csp, assignment, itemsize):
+    var = main.select_unassigned_variable(csp)
+    children = []
+    for value in values_of(csp.domains[var.id]):
+        if csp.is_consistent(var.id, value, assignment):
+            assignment[var.letter] = value
+            mark = csp.trail_mark()
+            if csp.update_domains(var, value, assignment):
+                csp.set_assigned(var)
+                children.append(packed.pack(csp, itemsize))
+                csp.set_unassigned(var)
+            assignment.pop(var.letter)
+            csp.undo(mark)
+    return children
+
+
+# log2 of the product of the domain sizes of the unassigned letters and carries
+def search_space_bits(csp):
+    bits = 0.0
+    for letter, positions in csp.letter_positions.items():
+        if not csp.variables[positions[0]].is_assigned:
+            bits += math.log2(max(csp.domain_size(positions[0]), 1))
+    return bits
+
+
+# Runs in a worker. Returns ('solved', solution), ('split', children), ('failure', None)
+# or ('cancelled', None).
+def solve_subproblem(text, state, propagation, split_bits, base=10):
+    try:
+        puzzle, csp = create_csp(text, propagation, base)
+        if csp is None:
+            return 'failure', None
+        assignment = packed.restore(csp, state)
+        if csp.assignment_is_complete():
+            return 'solved', {letter: assignment[letter] for letter in puzzle.distinct_letters}
+        if search_space_bits(csp) > split_bits:
+            return 'split', expand(csp, assignment, packed.domain_itemsize(puzzle))
+
+        solved = main.backtrack(csp, assignment)
+        if solved == 'failure':
+            return 'failure', None
+        return 'solved', {letter: solved[letter] for letter in puzzle.distinct_letters}
+    except Cancelled:
+        return 'cancelled', None
+
+
+# Expands the tree breadth first in the parent until there are at least count
+# subproblems, or the tree cannot be expanded more. The same CSP is restored to every
+# node of the frontier in turn.
+def initial_split(text, propagation, count, base=10):
+    puzzle, csp = create_csp(text, propagation, base)
+    if csp is None:
+        return []
+    itemsize = packed.domain_itemsize(puzzle)
+    frontier = [packed.pack(csp, itemsize)]
+    while len(frontier) < count:
+        next_frontier = []
+        expanded = False
+        for state in frontier:
+            assignment = packed.restore(csp, state)
+            if csp.assignment_is_complete():
+                next_frontier.append(state)
+                continue
+            next_frontier.extend(expand(csp, assignment, itemsize))
+            expanded = True
+        frontier = next_frontier
+        if not expanded:
+            break
+    return frontier
+
+
+# Solves the puzzle, written in the base, with a pool of workers and returns the value
+# of every letter or 'failure'
+def solve_parallel(text, workers=None, propagation='bounds', split_bits=24, subproblems_per_worker=4, base=10):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # Invalid puzzles raise ValueError here, before the pool starts
+    Puzzle.parse(text, base)
+    frontier = initial_split(text, propagation, workers * subproblems_per_worker, base)
+
+    stop_event = multiprocessing.Event()
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(stop_event,))
+    try:
+        pending = set()
+        for state in frontier:
+            pending.add(executor.submit(solve_subproblem, text, state, propagation, split_bits, base))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                status, payload = future.result()
+                if status == 'solved':
+                    stop_event.set()
+                    return payload
+                if status == 'split':
+                    for state in payload:
+                        pending.add(executor.submit(solve_subproblem, text, state, propagation, split_bits,
+                                                    base))
+        return 'failure'
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve one cryptarithmetic puzzle with many processes')
+    parser.add_argument('puzzle', help="puzzle such as 'SEND + MORE = MONEY'")
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--propagation', default='bounds', choices=CSP.PROPAGATIONS)
+    parser.add_argument('--split-bits', type=float, default=24,
+                        help='subtrees with a bigger log2 search space are split again')
+    parser.add_argument('--base', type=int, default=10, help='base of the numbers of the puzzle')
+    args = parser.parse_args()
+
+    solved = solve_parallel(args.puzzle, args.workers, args.propagation, args.split_bits, base=args.base)
+    if solved == 'failure':
+        print('failure')
+    else:
+        for line in Puzzle.parse(args.puzzle, args.base).format_solution(solved):
+            print(line)
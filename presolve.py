@@ -0,0 +1,161 @@
+# Presolve: reductions of the domains derived from the structure of the puzzle before
+# the search starts. Usage: python presolve.py PUZZLE
+#
+# presolve() starts with every digit for every letter and every carry value up to its
+# bound, and applies these rules in order (the first ones only to sums, and the column
+# rules only to the columns without products):
+# - 'length': a result shorter than an addend of several letters is unsatisfiable,
+#   since the sum has at least as many digits as its longest addend.
+# - 'leading_nonzero': the first letter of a word of several letters is not 0.
+# - 'leading_carry': when the result is longer than every addend, its first letter is
+#   the last carry, so it is at most the bound of that carry (1 with two addends).
+# - 'same_letter': a letter that appears as an addend and as the result of a column
+#   cancels out of that column (e.g. c + A + B = A + 10 * c' is B + c = 10 * c').
+# - 'parity': in a column sum(coef * x) == 0, coef_k * x_k must be a multiple of the
+#   gcd g of the other coefficients, so x_k only keeps the values v with
+#   coef_k * v % g == 0. For A + A = B + 10 * c, B must be even.
+# - 'propagation': the bounds and Hall interval propagation of CSP on the result.
+#
+# It returns a dict with:
+# - status: 'unsat' when a rule proves that the puzzle has no solution, else 'ok'
+# - unsat_rule: the rule that proved it, when the status is 'unsat'
+# - domains: the reduced domains, one bitmask per variable of the puzzle
+# - fixed: the letters and carries left with a single value, as {letter: value}
+# - bits_before / bits_after: log2 of the product of the domain sizes of the letters
+#   and carries before and after the presolve
+# - removed: the bits of search space removed by every rule
+import sys
+import math
+from CSP import CSP
+from bitmask import popcount, mask_of, values_of
+
+RULES = ('length', 'leading_nonzero', 'leading_carry', 'same_letter', 'parity', 'propagation')
+
+
+# Terms (letter, coef) of every column, with the coefficients of a repeated letter
+# added together, or None for a column with products (multiplications), which the
+# column rules leave alone. Also returns the number of terms that cancelled out.
+def column_terms(puzzle):
+    columns = []
+    cancelled = 0
+    for ids, coefs in puzzle.columns:
+        if any(isinstance(term, tuple) for term in ids):
+            columns.append(None)
+            continue
+        letter_coefs = {}
+        for k in range(len(ids)):
+            if ids[k] < puzzle.num_positions:
+                letter = puzzle.letters[ids[k]]
+            else:
+                letter = puzzle.carry_letter(ids[k] - puzzle.num_positions)
+            letter_coefs[letter] = letter_coefs.get(letter, 0) + coefs[k]
+        cancelled += sum(1 for coef in letter_coefs.values() if coef == 0)
+        columns.append([(letter, coef) for letter, coef in letter_coefs.items() if coef != 0])
+    return columns, cancelled
+
+
+def search_space_bits(letter_domains):
+    bits = 0.0
+    for domain in letter_domains.values():
+        bits += math.log2(max(popcount(domain), 1))
+    return bits
+
+
+# The 'propagation' rule is only applied when propagate is True, since the search
+# propagates the domains again anyway
+def presolve(puzzle, propagate=True):
+    base = puzzle.base
+    letter_domains = {letter: (1 << base) - 1 for letter in puzzle.distinct_letters}
+    for j in range(puzzle.num_carries):
+        letter_domains[puzzle.carry_letter(j)] = mask_of(range(puzzle.carry_bounds[j] + 1))
+    report = {
+        'status': 'ok',
+        'bits_before': search_space_bits(letter_domains),
+        'removed': {rule: 0.0 for rule in RULES},
+    }
+    bits = report['bits_before']
+
+    def finish(rule):
+        nonlocal bits
+        new_bits = search_space_bits(letter_domains)
+        report['removed'][rule] = bits - new_bits
+        bits = new_bits
+        if any(domain == 0 for domain in letter_domains.values()):
+            report['status'] = 'unsat'
+            report['unsat_rule'] = rule
+
+    longest = max((len(word) for word in puzzle.addends if len(word) > 1), default=1)
+    if puzzle.operator == '+' and len(puzzle.result) < longest:
+        report['status'] = 'unsat'
+        report['unsat_rule'] = 'length'
+
+    if report['status'] == 'ok':
+        for i in puzzle.leading:
+            letter_domains[puzzle.letters[i]] &= ~1
+        finish('leading_nonzero')
+
+    if report['status'] == 'ok':
+        top_addend = max(len(word) for word in puzzle.addends)
+        if puzzle.operator == '+' and len(puzzle.result) > top_addend and puzzle.num_carries > 0:
+            letter_domains[puzzle.result[0]] &= mask_of(range(puzzle.carry_bounds[-1] + 1))
+        finish('leading_carry')
+
+    columns, cancelled = column_terms(puzzle)
+    report['cancelled_terms'] = cancelled
+    if report['status'] == 'ok':
+        # The cancelled terms are already left out of the columns, and a column left
+        # with a single term forces it to 0
+        for terms in columns:
+            if terms is not None and len(terms) == 1:
+                letter_domains[terms[0][0]] &= 1
+        finish('same_letter')
+
+    if report['status'] == 'ok':
+        for terms in columns:
+            for k in range(len(terms) if terms is not None else 0):
+                g = 0
+                for other in range(len(terms)):
+                    if other != k:
+                        g = math.gcd(g, terms[other][1])
+                if g > 1:
+                    letter, coef = terms[k]
+                    allowed = mask_of(v for v in values_of(letter_domains[letter]) if coef * v % g == 0)
+                    letter_domains[letter] &= allowed
+        finish('parity')
+
+    domains = []
+    for i in range(puzzle.num_positions):
+        domains.append(letter_domains[puzzle.letters[i]])
+    for j in range(puzzle.num_carries):
+        domains.append(letter_domains[puzzle.carry_letter(j)])
+
+    if report['status'] == 'ok' and propagate:
+        csp = CSP(puzzle.variables(), domains, puzzle.columns, 'hall')
+        if csp.propagate(csp.letter_positions):
+            domains = csp.domains
+            for letter, ids in csp.letter_positions.items():
+                letter_domains[letter] = domains[ids[0]]
+        else:
+            for letter in letter_domains:
+                letter_domains[letter] = 0
+        finish('propagation')
+
+    report['domains'] = domains
+    report['fixed'] = {}
+    if report['status'] == 'ok':
+        for letter, domain in letter_domains.items():
+            if popcount(domain) == 1:
+                report['fixed'][letter] = domain.bit_length() - 1
+    report['bits_after'] = bits if report['status'] == 'ok' else 0.0
+    return report
+
+
+if __name__ == '__main__':
+    from Puzzle import Puzzle
+    puzzle = Puzzle.parse(sys.argv[1])
+    report = presolve(puzzle)
+    print('status:', report['status'], report.get('unsat_rule', ''))
+    print('search space: 2^%.1f -> 2^%.1f' % (report['bits_before'], report['bits_after']))
+    for rule in RULES:
+        print('  %-16s %6.1f bits' % (rule, report['removed'][rule]))
+    print('fixed:', ' '.join(letter + '=' + str(value) for letter, value in sorted(report['fixed'].items())))
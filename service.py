@@ -0,0 +1,237 @@
+# Solver service: a long-running process that answers puzzles as they arrive, so the
+# interpreter startup, the imports and the caches are paid once instead of once per
+# puzzle.
+# Usage: python service.py [--http HOST:PORT] [-w WORKERS] [--max-pending N]
+#                          [--timeout SECONDS] [--max-nodes N] [--cache-size N]
+#                          [--cache-file FILE] [--base B]
+#
+# Requests are JSON objects with the puzzle in 'puzzle' (e.g. "SEND + MORE = MONEY"),
+# and an optional 'id', 'timeout' in seconds, 'max_nodes' and 'base' of the numbers
+# (--base, 10 by default, when it is missing). Answers have the fields
+# of batch.py ('id', 'puzzle', 'status', 'solution', 'error', 'time'), with the
+# 'nodes' and the best 'partial' assignment of a puzzle that ran out of its timeout
+# or max_nodes (status 'time_limit' or 'node_limit'). The status can also be 'busy'.
+# - Without --http, requests are read from stdin, one per line, and every answer is
+#   written to stdout as one line as soon as it is ready, so answers may come out of
+#   order and are matched by their id (the line number when the request has none). A
+#   line that is not a valid request is answered with the id None and its 'line'.
+# - With --http, requests are POSTed to /solve and answered in the response. GET
+#   /health returns the number of requests in progress.
+#
+# The puzzles are solved by a pool of workers processes that live as long as the
+# service, each with its own SolutionCache (see batch.init_cache). At most max_pending
+# requests are in progress: on stdin the service stops reading until one is answered,
+# and over HTTP the extra requests get the status 'busy' (HTTP 503). The search of a
+# request stops when its timeout or max_nodes run out, so a hard puzzle cannot keep a
+# worker busy for longer than the timeout.
+import os
+import sys
+import json
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from CSP import CSP
+import batch
+
+
+# Runs in a worker: answers one request
+def solve_request(request_id, text, propagation, timeout, max_nodes=None, base=10):
+    return batch.solve_one(request_id, text, propagation, timeout, max_nodes, base)
+
+
+def error_result(request_id, text, status, message):
+    return {'id': request_id, 'puzzle': text, 'status': status, 'solution': None, 'error': message, 'time': 0.0}
+
+
+# Answer of a finished request, or an 'error' answer when the worker raised
+def future_result(future, request_id, text):
+    try:
+        return future.result()
+    except Exception as error:
+        return error_result(request_id, text, 'error', 'The worker failed: ' + repr(error))
+
+
+# Pool of workers with a bound on the requests in progress
+class Service:
+    def __init__(self, workers=None, max_pending=None, propagation='bounds', timeout=None,
+                 max_nodes=None, cache_size=1024, cache_file=None, base=10):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=batch.init_cache,
+                                            initargs=(cache_size, cache_file))
+        if max_pending is None:
+            max_pending = 4 * workers
+        self.max_pending = max_pending
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.propagation = propagation
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.base = base
+
+    # Returns a future with the answer of the request, or None when max_pending
+    # requests are in progress and blocking is False
+    def submit(self, request_id, text, timeout=None, max_nodes=None, base=None, blocking=True):
+        if not self.slots.acquire(blocking):
+            return None
+        with self.lock:
+            self.pending += 1
+        if timeout is None:
+            timeout = self.timeout
+        if max_nodes is None:
+            max_nodes = self.max_nodes
+        if base is None:
+            base = self.base
+        future = self.executor.submit(solve_request, request_id, text, self.propagation, timeout, max_nodes,
+                                      base)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+# Parses a request line or body into (id, puzzle, timeout, max_nodes, base). timeout
+# must be a non-negative number, max_nodes a non-negative integer and base an integer
+# of at least 2, when they are given.
+def parse_request(data, default_id):
+    item = json.loads(data)
+    if not isinstance(item, dict) or not isinstance(item.get('puzzle'), str):
+        raise ValueError("The request must be a JSON object with a 'puzzle' string")
+    timeout = item.get('timeout')
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                or not timeout >= 0):
+        raise ValueError("'timeout' must be a non-negative number of seconds")
+    max_nodes = item.get('max_nodes')
+    if max_nodes is not None and (isinstance(max_nodes, bool) or not isinstance(max_nodes, int) or max_nodes < 0):
+        raise ValueError("'max_nodes' must be a non-negative integer")
+    base = item.get('base')
+    if base is not None and (isinstance(base, bool) or not isinstance(base, int) or base < 2):
+        raise ValueError("'base' must be an integer of at least 2")
+    return item.get('id', default_id), item['puzzle'], timeout, max_nodes, base
+
+
+def serve_stdin(service, input_file=sys.stdin, output_file=sys.stdout):
+    write_lock = threading.Lock()
+
+    def write(result):
+        with write_lock:
+            output_file.write(json.dumps(result) + '\n')
+            output_file.flush()
+
+    futures = []
+    for number, line in enumerate(input_file, 1):
+        if not line.strip():
+            continue
+        try:
+            request_id, text, timeout, max_nodes, base = parse_request(line, number)
+        except ValueError as error:
+            # The request has no id of its own, so the answer gives its line instead
+            result = error_result(None, None, 'error', str(error))
+            result['line'] = number
+            write(result)
+            continue
+        future = service.submit(request_id, text, timeout, max_nodes, base)
+        future.add_done_callback(lambda done, request_id=request_id, text=text:
+                                 write(future_result(done, request_id, text)))
+        futures.append(future)
+        futures = [pending for pending in futures if not pending.done()]
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            # Already answered with an error by the callback
+            pass
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, code, data):
+            body = json.dumps(data).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            if code == 503:
+                self.send_header('Retry-After', '1')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != '/health':
+                self.send_json(404, {'error': 'Not found'})
+                return
+            self.send_json(200, {'pending': service.pending, 'max_pending': service.max_pending})
+
+        def do_POST(self):
+            if self.path != '/solve':
+                self.send_json(404, {'error': 'Not found'})
+                return
+            length = self.headers.get('Content-Length')
+            if length is None:
+                self.send_json(411, error_result(None, None, 'error', 'Content-Length is required'))
+                return
+            try:
+                length = int(length)
+                if length < 0:
+                    raise ValueError
+            except ValueError:
+                self.send_json(400, error_result(None, None, 'error', 'Invalid Content-Length: ' + repr(length)))
+                return
+            data = self.rfile.read(length)
+            try:
+                request_id, text, timeout, max_nodes, base = parse_request(data, None)
+            except ValueError as error:
+                self.send_json(400, error_result(None, None, 'error', str(error)))
+                return
+            future = service.submit(request_id, text, timeout, max_nodes, base, blocking=False)
+            if future is None:
+                self.send_json(503, error_result(request_id, text, 'busy', 'Too many requests in progress'))
+                return
+            self.send_json(200, future_result(future, request_id, text))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve_http(service, host, port):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Long-running cryptarithmetic solver')
+    parser.add_argument('--http', default=None, help='HOST:PORT to serve HTTP on, stdin/stdout when missing')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of processes')
+    parser.add_argument('--max-pending', type=int, default=None, help='requests in progress at once')
+    parser.add_argument('--timeout', type=float, default=None, help='default seconds per request')
+    parser.add_argument('--max-nodes', type=int, default=None, help='default nodes per request')
+    parser.add_argument('--propagation', default='bounds', choices=CSP.PROPAGATIONS)
+    parser.add_argument('--cache-size', type=int, default=1024, help='cached results per worker, 0 to disable')
+    parser.add_argument('--cache-file', default=None, help='SQLite file that keeps the results between runs')
+    parser.add_argument('--base', type=int, default=10, help='default base of the numbers of the puzzles')
+    args = parser.parse_args()
+
+    service = Service(args.workers, args.max_pending, args.propagation, args.timeout, args.max_nodes,
+                      args.cache_size, args.cache_file, args.base)
+    try:
+        if args.http is None:
+            serve_stdin(service)
+        else:
+            host, port = args.http.rsplit(':', 1)
+            serve_http(service, host, int(port))
+    finally:
+        service.close()
@@ -0,0 +1,85 @@
+# Streaming mode: reads puzzles one per line and writes one result line per puzzle as
+# soon as it is solved, so files of any size are solved in constant memory.
+# Usage: python stream.py [INPUT] [-o OUTPUT] [--propagation P] [--engine E] [--base B]
+#
+# INPUT and OUTPUT are file names, or '-' (the default) for stdin and stdout. Every
+# input line is a puzzle such as SEND+MORE=MONEY, A-B=C or AB*C=DEF (spaces around
+# the words are ignored) in the base given by --base; blank lines and lines starting
+# with '#' are skipped. Every output line is
+# the puzzle, a tab and its result:
+#   SEND+MORE=MONEY	9567+1085=10652
+#   ABCD+EFG=AB	failure
+#   A+B	error: A puzzle needs at least one addend and a result
+#
+# The input is read line by line and the output goes through a buffer of buffer_size
+# bytes, so neither is ever held in memory. Repeated puzzles are answered from a
+# bounded SolutionCache.
+import sys
+import argparse
+from CSP import CSP
+from Puzzle import Puzzle
+from SolutionCache import SolutionCache
+import main
+
+
+# Yields every puzzle of the file as its stripped line
+def read_puzzle_lines(file):
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def format_result(puzzle, solved):
+    if solved == 'failure':
+        return 'failure'
+    return puzzle.format_equation(solved)
+
+
+# Solves every puzzle of input_file and writes its result line to output_file.
+# Returns the number of puzzles read.
+def solve_stream(input_file, output_file, propagation='bounds', engine='iterative', cache=None, base=10):
+    count = 0
+    for text in read_puzzle_lines(input_file):
+        try:
+            puzzle = Puzzle.parse(text, base)
+            result = format_result(puzzle, main.solve_puzzle(puzzle, propagation, engine, cache=cache))
+        except ValueError as error:
+            result = 'error: ' + str(error)
+        output_file.write(text + '\t' + result + '\n')
+        count += 1
+    return count
+
+
+def open_input(name):
+    if name == '-':
+        return sys.stdin
+    return open(name, 'r')
+
+
+def open_output(name, buffer_size):
+    if name == '-':
+        return open(sys.stdout.fileno(), 'w', buffering=buffer_size, closefd=False)
+    return open(name, 'w', buffering=buffer_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve one cryptarithmetic puzzle per line')
+    parser.add_argument('input', nargs='?', default='-', help='file with one puzzle per line, - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='output file, - for stdout')
+    parser.add_argument('--propagation', default='bounds', choices=CSP.PROPAGATIONS)
+    parser.add_argument('--engine', default='iterative', choices=('recursive', 'iterative', 'vectorized'))
+    parser.add_argument('--base', type=int, default=10, help='base of the numbers of the puzzles')
+    parser.add_argument('--cache-size', type=int, default=1024, help='cached results, 0 to disable')
+    parser.add_argument('--buffer-size', type=int, default=1 << 16, help='bytes of output buffer')
+    args = parser.parse_args()
+
+    cache = SolutionCache(args.cache_size) if args.cache_size > 0 else None
+    input_file = open_input(args.input)
+    output_file = open_output(args.output, args.buffer_size)
+    try:
+        solve_stream(input_file, output_file, args.propagation, args.engine, cache, args.base)
+    finally:
+        output_file.close()
+        if input_file is not sys.stdin:
+            input_file.close()
@@ -0,0 +1,88 @@
+# Lookup tables for the column constraints, used by the 'table' propagation of CSP.
+#
+# A column sum(coef * x) == 0 with few variables has few solutions, so they can all be
+# listed once: the table of a column is the list of its feasible tuples, and for every
+# variable k and value v the bitset supports[k][v] (an int) has bit t set when tuple t
+# gives the value v to the variable k. The tuples that are still possible with the
+# current domains are then
+#   valid = AND over k of (OR over v in domain k of supports[k][v])
+# and a value v stays in the domain of k only when supports[k][v] & valid != 0, so a
+# column is made arc consistent with a few int operations instead of arithmetic on
+# every combination of values. The OR of the supports of a domain is remembered in
+# unions[k][domain], since the same domains come back again and again in a search.
+#
+# A table only depends on the shape of the column: the coefficients of its terms, the
+# biggest value of each of them and its products of two variables (multiplications).
+# Columns are sorted by (coefficient, biggest value) into that shape, and the tables
+# are kept in SHAPES, so every column with the same shape, in this puzzle or any other
+# one solved by the process, shares one table.
+# Columns whose table would be too big to list get None and are left to the bounds
+# propagation.
+from itertools import product
+
+SHAPES = {}
+
+
+# Returns the supports and unions of the shape ((coef, high), ...) with the products
+# ((i, k, coef), ...) of the variables i and k, or None when listing the candidates
+# would take more than max_candidates steps
+def shape_table(shape, products=(), max_candidates=200000):
+    key = shape, products
+    if key in SHAPES:
+        return SHAPES[key]
+
+    candidates = 1
+    for _, high in shape[:-1]:
+        candidates *= high + 1
+    if candidates > max_candidates:
+        SHAPES[key] = None
+        return None
+
+    # The last variable is computed from the others instead of being enumerated, so
+    # it cannot be in a product. The terms of every other variable are listed as
+    # (term, value) pairs, and the sums are enumerated with itertools.product.
+    last_coef, last_high = shape[-1]
+    supports = [[0] * (high + 1) for _, high in shape]
+    last_supports = supports[-1]
+    terms = [[(coef * value, value) for value in range(high + 1)] for coef, high in shape[:-1]]
+    bit = 1
+    for combination in product(*terms):
+        total = 0
+        for term, _ in combination:
+            total += term
+        for i, k, coef in products:
+            total += coef * combination[i][1] * combination[k][1]
+        if total % last_coef == 0 and 0 <= -total // last_coef <= last_high:
+            for k in range(len(combination)):
+                supports[k][combination[k][1]] |= bit
+            last_supports[-total // last_coef] |= bit
+            bit <<= 1
+
+    table = supports, [{} for _ in shape]
+    SHAPES[key] = table
+    return table
+
+
+# Returns the letters of the column in the order of its shape, their supports and
+# unions, or None when the column has no table. The column is given by its terms
+# (letter, coef) and its products (letter, letter, coef), and highs holds the
+# biggest value of the domain of every letter. The letters of the products go
+# first, so that the last letter, which is computed, is not in a product.
+def column_table(terms, highs, products=(), max_candidates=200000):
+    coefs = dict(terms)
+    product_letters = set()
+    for first, second, _ in products:
+        product_letters.update((first, second))
+    letters = list(coefs) + sorted(product_letters.difference(coefs))
+    ordered = sorted(letters, key=lambda letter: (letter not in product_letters, coefs.get(letter, 0), highs[letter]))
+    if len(ordered) == 0 or ordered[-1] in product_letters:
+        return None
+    shape = tuple((coefs.get(letter, 0), highs[letter]) for letter in ordered)
+    index = {letter: k for k, letter in enumerate(ordered)}
+    shape_products = tuple(sorted((min(index[first], index[second]), max(index[first], index[second]), coef)
+                                  for first, second, coef in products))
+    table = shape_table(shape, shape_products, max_candidates)
+    if table is None:
+        return None
+    supports, unions = table
+    return ordered, supports, unions
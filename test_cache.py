@@ -0,0 +1,54 @@
+# Keys of SolutionCache: puzzles that only differ in the names of their letters or the
+# order of their addends share a key, and other puzzles do not.
+# Usage: python -m pytest test_cache.py
+import pytest
+from Puzzle import Puzzle
+from SolutionCache import SolutionCache
+import main
+
+
+def key(text, base=10):
+    return SolutionCache.canonical(Puzzle.parse(text, base))[0]
+
+
+@pytest.mark.parametrize('text, other', [
+    ('SEND+MORE=MONEY', 'MORE+SEND=MONEY'),
+    ('SEND+MORE=MONEY', 'AEND+ZORE=ZONEY'),
+    ('SEND+MORE=MONEY', 'ZORE+AEND=ZONEY'),
+    ('TO+GO=OUT', 'GO+TO=OUT'),
+    ('TO+GO=OUT', 'AB+CB=BDA'),
+    ('SIX+SEVEN+SEVEN=TWENTY', 'SEVEN+SIX+SEVEN=TWENTY'),
+    ('AB+CD+EF=GHI', 'EF+AB+CD=GHI'),
+    ('AB*CD=EFGH', 'CD*AB=EFGH'),
+])
+def test_same_key(text, other):
+    assert key(text) == key(other)
+
+
+@pytest.mark.parametrize('text, other', [
+    ('SEND+MORE=MONEY', 'SEND+MORE=MONEE'),
+    ('TO+GO=OUT', 'TO+GO=OTU'),
+    ('AB+CD=EF', 'AB+CD=EA'),
+    ('AB+AB=CD', 'AB+CD=EF'),
+])
+def test_different_key(text, other):
+    assert key(text) != key(other)
+
+
+def test_base_is_part_of_the_key():
+    assert key('SEND+MORE=MONEY', 10) != key('SEND+MORE=MONEY', 16)
+
+
+# A renamed puzzle is answered from the cache with its own letters
+@pytest.mark.parametrize('text, renamed', [
+    ('SEND+MORE=MONEY', 'ZORE+AEND=ZONEY'),
+    ('TO+GO=OUT', 'AB+CB=BDA'),
+    ('AB+AB=C', 'XY+XY=Z'),
+])
+def test_cache_hit_on_renamed_puzzle(text, renamed):
+    cache = SolutionCache()
+    main.solve_puzzle(Puzzle.parse(text), cache=cache)
+    puzzle = Puzzle.parse(renamed)
+    solved = main.solve_puzzle(puzzle, cache=cache)
+    assert cache.hits == 1
+    assert solved == main.solve_puzzle(puzzle)
@@ -0,0 +1,147 @@
+# Malformed input of batch.py and service.py: every bad line or request gets an error
+# answer and the others are still solved.
+# Usage: python -m pytest test_inputs.py
+import io
+import json
+import socket
+import threading
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer
+import pytest
+import batch
+import service
+
+BAD_LINES = [
+    'not json',
+    '[1, 2]',
+    '{"id": "x"}',
+    '{"puzzle": 12}',
+    '{"puzzle": null}',
+]
+
+
+def test_read_jsonl():
+    lines = ['{"id": "a", "puzzle": "TO+GO=OUT"}', ''] + BAD_LINES + ['{"puzzle": "SEND+MORE=MONEY"}']
+    items = list(batch.read_jsonl(io.StringIO('\n'.join(lines) + '\n'), 'in'))
+    assert [puzzle_id for puzzle_id, _ in items] == ['a', 'in:3', 'in:4', 'in:5', 'in:6', 'in:7', 'in:8']
+    assert items[0][1] == 'TO+GO=OUT'
+    assert items[-1][1] == 'SEND+MORE=MONEY'
+    assert all(isinstance(text, batch.InvalidInput) for _, text in items[1:-1])
+
+
+@pytest.mark.parametrize('text', [batch.InvalidInput('Invalid JSON'), 12, None, 'A+=B', 'AB+CD', 'A+B=C=D'])
+def test_solve_one_error(text):
+    result = batch.solve_one('x', text, 'bounds')
+    assert result['id'] == 'x'
+    assert result['status'] == 'error'
+    assert result['solution'] is None
+    assert result['error']
+
+
+def test_solve_batch_goes_on(tmp_path):
+    path = tmp_path / 'puzzles.jsonl'
+    path.write_text('\n'.join(['{"puzzle": "TO+GO=OUT"}'] + BAD_LINES + ['{"puzzle": "AB+AB=C"}']) + '\n')
+    results = list(batch.solve_batch([str(path)], workers=1, chunk_size=2))
+    assert [result['status'] for result in results] == ['solved'] + ['error'] * len(BAD_LINES) + ['failure']
+    assert [result['id'] for result in results] == [str(path) + ':' + str(n) for n in range(1, len(BAD_LINES) + 3)]
+
+
+@pytest.mark.parametrize('data', BAD_LINES + [
+    '{"puzzle": "TO+GO=OUT", "timeout": -1}',
+    '{"puzzle": "TO+GO=OUT", "timeout": "1"}',
+    '{"puzzle": "TO+GO=OUT", "timeout": true}',
+    '{"puzzle": "TO+GO=OUT", "max_nodes": 1.5}',
+    '{"puzzle": "TO+GO=OUT", "max_nodes": -1}',
+    '{"puzzle": "TO+GO=OUT", "max_nodes": false}',
+    '{"puzzle": "TO+GO=OUT", "base": 1}',
+    '{"puzzle": "TO+GO=OUT", "base": "16"}',
+    '{"puzzle": "TO+GO=OUT", "base": true}',
+])
+def test_parse_request_error(data):
+    with pytest.raises(ValueError):
+        service.parse_request(data, 1)
+
+
+def test_parse_request():
+    data = '{"id": "a", "puzzle": "TO+GO=OUT", "timeout": 0, "max_nodes": 10, "base": 16}'
+    assert service.parse_request(data, 1) == ('a', 'TO+GO=OUT', 0, 10, 16)
+    assert service.parse_request('{"puzzle": "TO+GO=OUT"}', 7) == (7, 'TO+GO=OUT', None, None, None)
+
+
+def test_future_result_of_a_failed_worker():
+    future = Future()
+    future.set_exception(RuntimeError('boom'))
+    result = service.future_result(future, 'a', 'TO+GO=OUT')
+    assert result['status'] == 'error'
+    assert result['id'] == 'a'
+    assert 'boom' in result['error']
+
+
+@pytest.fixture(scope='module')
+def solver():
+    solver = service.Service(workers=1, cache_size=0)
+    yield solver
+    solver.close()
+
+
+def test_serve_stdin(solver):
+    lines = ['{"id": "a", "puzzle": "TO+GO=OUT"}'] + BAD_LINES + ['{"puzzle": "A+=B"}', '{"puzzle": "AB+AB=C"}']
+    output = io.StringIO()
+    service.serve_stdin(solver, io.StringIO('\n'.join(lines) + '\n'), output)
+    answers = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(answers) == len(lines)
+    bad = sorted(answer['line'] for answer in answers if 'line' in answer)
+    assert bad == list(range(2, len(BAD_LINES) + 2))
+    by_id = {answer['id']: answer for answer in answers if 'line' not in answer}
+    assert by_id['a']['status'] == 'solved'
+    assert by_id[len(lines) - 1]['status'] == 'error'
+    assert by_id[len(lines)]['status'] == 'failure'
+
+
+@pytest.fixture(scope='module')
+def http_server(solver):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), service.make_handler(solver))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+# Sends the raw request and returns the status code and the JSON body of the answer
+def post(address, headers, body=b''):
+    with socket.create_connection(address, timeout=10) as connection:
+        head = 'POST /solve HTTP/1.1\r\nHost: test\r\n' + ''.join(name + ': ' + value + '\r\n'
+                                                                  for name, value in headers.items())
+        connection.sendall(head.encode() + b'\r\n' + body)
+        answer = b''
+        while True:
+            data = connection.recv(4096)
+            if not data:
+                break
+            answer += data
+    head, _, body = answer.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+@pytest.mark.parametrize('length, code', [(None, 411), ('abc', 400), ('-1', 400), ('1.5', 400)])
+def test_http_content_length(http_server, length, code):
+    headers = {} if length is None else {'Content-Length': length}
+    status, answer = post(http_server, headers)
+    assert status == code
+    assert answer['status'] == 'error'
+
+
+@pytest.mark.parametrize('body', [b'not json', b'{"puzzle": 12}', b'{"puzzle": "TO+GO=OUT", "timeout": -1}'])
+def test_http_bad_request(http_server, body):
+    status, answer = post(http_server, {'Content-Length': str(len(body))}, body)
+    assert status == 400
+    assert answer['status'] == 'error'
+
+
+def test_http_solve(http_server):
+    body = b'{"id": "a", "puzzle": "SEND+MORE=MONEY", "base": 16}'
+    status, answer = post(http_server, {'Content-Length': str(len(body))}, body)
+    assert status == 200
+    assert answer['status'] == 'solved'
+    assert answer['solution']['D'] == 13
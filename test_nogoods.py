@@ -0,0 +1,94 @@
+# Soundness of NogoodStore: a search with the store finds the same solutions as the
+# search without it, with every engine, propagation and strategy, and when one store
+# is used for many puzzles.
+# Usage: python -m pytest test_nogoods.py
+import json
+import random
+import pytest
+from CSP import CSP
+from NogoodStore import NogoodStore
+from Puzzle import Puzzle
+from Search import Search
+from Strategy import Strategy
+import main
+
+PUZZLES = ['TO+GO=OUT', 'A+B=CD', 'AB+AB=C', 'AB+CD=EF', 'A+B+C=DE', 'SEND+MORE=MONEY', 'CROSS+ROADS=DANGER',
+           'SIX+SEVEN+SEVEN=TWENTY', 'AB*C=DE', 'FD+CC=EDC', 'BF+GD=DFD']
+
+
+def sorted_solutions(solutions):
+    return sorted(tuple(sorted(solution.items())) for solution in solutions)
+
+
+@pytest.mark.parametrize('propagation', CSP.PROPAGATIONS)
+@pytest.mark.parametrize('text', PUZZLES)
+def test_recursive(text, propagation):
+    puzzle = Puzzle.parse(text)
+    expected = sorted_solutions(main.solve_all(puzzle, None, propagation))
+    assert main.count_solutions(puzzle, None, propagation, NogoodStore()) == len(expected)
+    assert sorted_solutions(main.solve_all(puzzle, None, propagation, nogoods=NogoodStore())) == expected
+
+
+@pytest.mark.parametrize('strategy', [('mrv', 'lex'), ('domwdeg', 'lcv'), ('domwdeg', 'carry')])
+@pytest.mark.parametrize('text', PUZZLES)
+def test_iterative(text, strategy):
+    puzzle = Puzzle.parse(text)
+    expected = sorted_solutions(main.solve_all(puzzle))
+    csp = main.build_csp(puzzle, nogoods=NogoodStore(), strategy=Strategy(*strategy))
+    found = []
+    if csp is not None:
+        search = Search(csp)
+        while search.run() != 'failure':
+            found.append({letter: search.assignment[letter] for letter in puzzle.distinct_letters})
+    assert sorted_solutions(found) == expected
+
+
+# A store too small for the search evicts nogoods but never loses solutions
+@pytest.mark.parametrize('text', PUZZLES)
+def test_small_store(text):
+    puzzle = Puzzle.parse(text)
+    assert main.count_solutions(puzzle, None, 'bounds', NogoodStore(4)) == main.count_solutions(puzzle)
+
+
+# Random sums of up to three words of up to three of the letters A to G
+def random_puzzles(seed, count):
+    rng = random.Random(seed)
+    puzzles = []
+    while len(puzzles) < count:
+        words = [''.join(rng.choice('ABCDEFG') for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(2, 4))]
+        try:
+            puzzles.append(Puzzle(words[:-1], words[-1]))
+        except ValueError:
+            pass
+    return puzzles
+
+
+# The nogoods of a puzzle must not prune the search of the next one
+@pytest.mark.parametrize('propagation', CSP.PROPAGATIONS)
+def test_shared_store(propagation):
+    store = NogoodStore()
+    for puzzle in [Puzzle.parse(text) for text in PUZZLES] + random_puzzles(1, 150):
+        expected = main.count_solutions(puzzle, None, propagation)
+        assert main.count_solutions(puzzle, None, propagation, store) == expected, puzzle.display_words
+
+
+# A search paused and rebuilt from its JSON state keeps its nogoods sound
+@pytest.mark.parametrize('text', PUZZLES)
+def test_resumed_search(text):
+    puzzle = Puzzle.parse(text)
+    expected = sorted_solutions(main.solve_all(puzzle))
+    csp = main.build_csp(puzzle, nogoods=NogoodStore(), strategy=Strategy('mrv', 'lcv'))
+    found = []
+    if csp is not None:
+        search = Search(csp)
+        while True:
+            solved = search.run(3)
+            if solved == 'paused':
+                state = json.loads(json.dumps(search.get_state()))
+                csp = main.build_csp(puzzle, nogoods=NogoodStore(), strategy=Strategy('mrv', 'lcv'))
+                search = Search.from_state(csp, state)
+            elif solved == 'failure':
+                break
+            else:
+                found.append({letter: solved[letter] for letter in puzzle.distinct_letters})
+    assert sorted_solutions(found) == expected
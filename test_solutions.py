@@ -0,0 +1,115 @@
+# Solution counts of every propagation and engine against a brute force over every
+# assignment of distinct digits to the letters.
+# Usage: python -m pytest test_solutions.py
+from itertools import permutations
+import pytest
+from CSP import CSP
+from Puzzle import Puzzle
+from Search import Search
+import main
+import vectorized
+
+PUZZLES = [
+    ('TO+GO=OUT', 10),
+    ('SO+SO=TOO', 10),
+    ('A+B=CD', 10),
+    ('AB+AB=C', 10),
+    ('AB+CD=EF', 10),
+    ('EAT+THAT=APPLE', 10),
+    ('A+B+C=DE', 10),
+    ('AB-CD=EF', 10),
+    ('AB*A=CB', 10),
+    ('A*A=B', 10),
+    ('AB*C=DE', 10),
+    ('A+B=C', 3),
+    ('AB+BA=CC', 7),
+    ('AB+A=BC', 16),
+]
+
+brute_counts = {}
+
+
+def value(word, assignment, base):
+    number = 0
+    for char in word:
+        number = number * base + assignment[char]
+    return number
+
+
+# Whether the assignment solves the puzzle as it is written
+def is_solution(puzzle, assignment):
+    words = puzzle.display_words
+    if len(set(assignment[letter] for letter in puzzle.distinct_letters)) != len(puzzle.distinct_letters):
+        return False
+    if any(len(word) > 1 and assignment[word[0]] == 0 for word in words):
+        return False
+    numbers = [value(word, assignment, puzzle.base) for word in words[:-1]]
+    result = value(words[-1], assignment, puzzle.base)
+    if puzzle.display_operator == '+':
+        return sum(numbers) == result
+    if puzzle.display_operator == '-':
+        return numbers[0] - sum(numbers[1:]) == result
+    return numbers[0] * numbers[1] == result
+
+
+def brute_force(text, base):
+    if (text, base) not in brute_counts:
+        puzzle = Puzzle.parse(text, base)
+        letters = puzzle.distinct_letters
+        brute_counts[text, base] = sum(1 for digits in permutations(range(base), len(letters))
+                                       if is_solution(puzzle, dict(zip(letters, digits))))
+    return brute_counts[text, base]
+
+
+@pytest.mark.parametrize('propagation', CSP.PROPAGATIONS)
+@pytest.mark.parametrize('text, base', PUZZLES)
+def test_count_solutions(text, base, propagation):
+    assert main.count_solutions(Puzzle.parse(text, base), None, propagation) == brute_force(text, base)
+
+
+@pytest.mark.parametrize('propagation', CSP.PROPAGATIONS)
+@pytest.mark.parametrize('text, base', PUZZLES)
+def test_solve_all(text, base, propagation):
+    puzzle = Puzzle.parse(text, base)
+    solutions = list(main.solve_all(puzzle, None, propagation))
+    assert all(is_solution(puzzle, solution) for solution in solutions)
+    assert len(solutions) == brute_force(text, base)
+
+
+@pytest.mark.parametrize('propagation', CSP.PROPAGATIONS)
+@pytest.mark.parametrize('text, base', PUZZLES)
+def test_iterative_search(text, base, propagation):
+    puzzle = Puzzle.parse(text, base)
+    csp = main.build_csp(puzzle, propagation)
+    found = 0
+    if csp is not None:
+        search = Search(csp)
+        while search.run() != 'failure':
+            assert is_solution(puzzle, search.assignment)
+            found += 1
+    assert found == brute_force(text, base)
+
+
+@pytest.mark.skipif(not vectorized.available(), reason='NumPy is not installed')
+@pytest.mark.parametrize('text, base', PUZZLES)
+def test_vectorized(text, base):
+    puzzle = Puzzle.parse(text, base)
+    values = vectorized.solve_columns(puzzle)
+    if values is None:
+        assert puzzle.operator != '+'
+        return
+    assert len(values) == brute_force(text, base)
+    for row in values:
+        assert is_solution(puzzle, {letter: int(row[k]) for k, letter in enumerate(puzzle.distinct_letters)})
+
+
+@pytest.mark.parametrize('engine', ['recursive', 'iterative', 'vectorized'])
+@pytest.mark.parametrize('propagation', CSP.PROPAGATIONS)
+@pytest.mark.parametrize('text, base', PUZZLES)
+def test_solve_puzzle(text, base, propagation, engine):
+    puzzle = Puzzle.parse(text, base)
+    solved = main.solve_puzzle(puzzle, propagation, engine)
+    if brute_force(text, base) == 0:
+        assert solved == 'failure'
+    else:
+        assert is_solution(puzzle, solved)
@@ -0,0 +1,145 @@
+# Column by column solver with NumPy. Instead of trying one value at a time, it keeps
+# every partial assignment that satisfies the columns solved so far as a row of a
+# frontier of arrays:
+# - values: value of every letter (-1 while the letter has no value yet)
+# - used: bitmask of the digits taken in the row, for the all different constraint
+# - carry: carry going into the next column
+# Starting with the rightmost column, every letter that appears for the first time is
+# expanded with all its digits not used yet in the row, and the rows that do not satisfy
+# the column sum are filtered out. When the letter of the result in the column is new,
+# its digit is computed from the sum of the column instead of being expanded.
+#
+# NumPy is optional: when it is not installed, or the frontier would grow past
+# max_rows, solve_columns() returns None and the caller falls back to backtracking.
+# It also returns None for multiplications, which have products in their columns.
+from bitmask import values_of
+from presolve import presolve
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def available():
+    return np is not None
+
+
+# Letters of column j as (letter index, coefficient) with the coefficients of a
+# repeated letter added together, and the bound of its carry out (None for the
+# last column, which has no carry out)
+def column_terms(puzzle, j, letter_index):
+    ids, coefs = puzzle.columns[j]
+    letter_coefs = {}
+    for k in range(len(ids)):
+        if ids[k] < puzzle.num_positions:
+            index = letter_index[puzzle.letters[ids[k]]]
+            letter_coefs[index] = letter_coefs.get(index, 0) + coefs[k]
+    bound = puzzle.carry_bounds[j] if j < puzzle.num_carries else None
+    return letter_coefs, bound
+
+
+# Returns the values of the letters of every solution, as an array with one row per
+# solution and one column per letter of puzzle.distinct_letters, or None when NumPy is
+# not installed or the frontier would have more than max_rows rows
+def solve_columns(puzzle, max_rows=2000000):
+    base = puzzle.base
+    if np is None or base > 62 or puzzle.operator != '+':
+        return None
+
+    letters = puzzle.distinct_letters
+    letter_index = {letter: k for k, letter in enumerate(letters)}
+    # The same start as the search (see main.initial_domains())
+    report = presolve(puzzle, propagate=False)
+    if report['status'] == 'unsat':
+        return np.full((0, len(letters)), -1, dtype=np.int16)
+    domains = report['domains']
+    letter_domains = [0] * len(letters)
+    for i in range(puzzle.num_positions):
+        letter_domains[letter_index[puzzle.letters[i]]] = domains[i]
+
+    values = np.full((1, len(letters)), -1, dtype=np.int16)
+    used = np.zeros(1, dtype=np.int64)
+    carry = np.zeros(1, dtype=np.int64)
+    assigned = [False] * len(letters)
+    result_ids = puzzle.word_ids[-1]
+
+    for j in range(puzzle.num_columns):
+        letter_coefs, bound = column_terms(puzzle, j, letter_index)
+
+        # The result letter of the column is computed from the sum when it is new and
+        # only appears as the result in this column
+        derived = None
+        if j < len(result_ids):
+            result_letter = letter_index[puzzle.letters[result_ids[-1 - j]]]
+            if not assigned[result_letter] and letter_coefs.get(result_letter) == -1:
+                derived = result_letter
+
+        for index in letter_coefs:
+            if assigned[index] or index == derived:
+                continue
+            digits = np.array(list(values_of(letter_domains[index])), dtype=np.int64)
+            # A letter left without digits by presolve() has no solution
+            if len(digits) == 0:
+                return values[:0]
+            rows = len(values) * len(digits)
+            if rows > max_rows:
+                return None
+            values = np.repeat(values, len(digits), axis=0)
+            used = np.repeat(used, len(digits))
+            carry = np.repeat(carry, len(digits))
+            new_digits = np.tile(digits, rows // len(digits))
+            bits = np.left_shift(1, new_digits)
+            keep = (used & bits) == 0
+            values = values[keep]
+            values[:, index] = new_digits[keep]
+            used = used[keep] | bits[keep]
+            carry = carry[keep]
+            assigned[index] = True
+
+        total = carry.copy()
+        for index, coef in letter_coefs.items():
+            if index != derived and coef != 0:
+                total += coef * values[:, index].astype(np.int64)
+
+        if derived is not None:
+            digit = total % base
+            carry_out = total // base
+            allowed = np.array([letter_domains[derived] >> d & 1 for d in range(base)], dtype=bool)
+            bits = np.left_shift(1, digit)
+            keep = allowed[digit] & ((used & bits) == 0)
+            if bound is None:
+                keep &= carry_out == 0
+            else:
+                keep &= carry_out <= bound
+            values = values[keep]
+            values[:, derived] = digit[keep]
+            used = used[keep] | bits[keep]
+            carry = carry_out[keep]
+            assigned[derived] = True
+        elif bound is None:
+            keep = total == 0
+            values = values[keep]
+            used = used[keep]
+            carry = carry[keep]
+        else:
+            keep = (total % base == 0) & (total >= 0) & (total // base <= bound)
+            values = values[keep]
+            used = used[keep]
+            carry = total[keep] // base
+
+        if len(values) == 0:
+            break
+
+    return values
+
+
+# First solution of the puzzle as {letter: digit}, 'failure', or None when the
+# vectorized solver cannot be used
+def solve_vectorized(puzzle, max_rows=2000000):
+    values = solve_columns(puzzle, max_rows)
+    if values is None:
+        return None
+    if len(values) == 0:
+        return 'failure'
+    return {letter: int(values[0, k]) for k, letter in enumerate(puzzle.distinct_letters)}